@@ -0,0 +1,162 @@
+"""Benchmark loading and rendering a synthetic EasySAM application.
+
+The `load` and `generate` measurements only use `easysam.load.resources` and `easysam.generate.generate`
+as they were before the optimizations, with all caches cleared before each run, so the script can compare
+a checkout of any version with the current one:
+
+    PYTHONPATH=<checkout>/src python scripts/benchmark_generate.py --functions 1000 --tables 500 --paths 1500
+
+The `render`, `cached` and `native` measurements are only made where the fragment renderer and the native
+emitter exist.
+
+Usage:
+    uv run python scripts/benchmark_generate.py --functions 1000 --tables 500 --paths 1500
+    uv run python scripts/benchmark_generate.py --functions 2000 --tables 1000 --paths 3000
+"""
+
+import logging as lg
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader
+
+import easysam.generate
+from easysam.generate import generate
+from easysam.load import resources as load_resources
+
+try:
+    from easysam.cache import DiskCache
+    from easysam.generate import FragmentRenderer, render_context
+    from easysam.native import build_template, emit_template
+except ImportError:
+    FragmentRenderer = None
+
+
+def make_app(app_dir: Path, functions: int, tables: int, paths: int):
+    """Write a synthetic application with imported lambdas, tables, queues and extra API paths."""
+    lines = ['prefix: BenchApp', 'import:', '  - backend', 'authorizers:', '  auth:', '    function: func0']
+    lines.extend(['    token: Authorization', 'queues:'])
+    lines.extend(f'  queue{i}:' for i in range(max(1, functions // 10)))
+    lines.append('buckets:')
+    lines.extend(f'  bucket{i}:\n    public: false' for i in range(max(1, functions // 10)))
+    lines.append('tables:')
+
+    for i in range(tables):
+        lines.append(f'  Table{i}:\n    attributes:\n      - name: ID\n        hash: true')
+
+        if i % 2 == 0 and functions:
+            lines.append(f'    trigger: func{i % functions}')
+
+    extra_paths = [i for i in range(functions, paths)]
+
+    if extra_paths and functions:
+        lines.append('paths:')
+        lines.extend(f'  /extra{i}:\n    function: func{i % functions}\n    open: true' for i in extra_paths)
+
+    Path(app_dir, 'resources.yaml').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    for i in range(functions):
+        func_dir = Path(app_dir, 'backend', 'function', f'func{i}')
+        func_dir.mkdir(parents=True)
+        Path(func_dir, 'index.py').write_text('def handler(event, context):\n    pass\n', encoding='utf-8')
+        Path(func_dir, 'easysam.yaml').write_text(
+            '\n'.join(
+                [
+                    'lambda:',
+                    f'  name: func{i}',
+                    '  resources:',
+                    f'    tables: [Table{i % max(1, tables)}]' if tables else '    tables: []',
+                    f'    buckets: [bucket{i % max(1, functions // 10)}]',
+                    f'    send: [queue{i % max(1, functions // 10)}]',
+                    '  integration:',
+                    f'    path: /func{i}' if i < paths else f'    path: /func{i}-only',
+                    '    open: true',
+                ]
+            )
+            + '\n',
+            encoding='utf-8',
+        )
+
+
+def measure(label: str, func, repeat: int, setup=None):
+    timings = []
+
+    for _ in range(repeat):
+        if setup:
+            setup()
+
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    print(f'{label:<10} best {min(timings):8.3f}s  mean {sum(timings) / len(timings):8.3f}s')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--functions', type=int, default=1000)
+    parser.add_argument('--tables', type=int, default=500)
+    parser.add_argument('--paths', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    lg.disable(lg.CRITICAL)
+    deploy_ctx = {'environment': 'dev', 'target_region': 'us-east-1'}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = Path(tmp, 'app')
+        app_dir.mkdir()
+        user_cache_dir = Path(tmp, 'user-cache')
+        os.environ['EASYSAM_CACHE_DIR'] = str(user_cache_dir)
+        make_app(app_dir, args.functions, args.tables, args.paths)
+        print(
+            f'Synthetic app: {args.functions} functions, {args.tables} tables, {max(args.paths, args.functions)} paths'
+        )
+
+        def clear_caches():
+            shutil.rmtree(Path(app_dir, 'build'), ignore_errors=True)
+            shutil.rmtree(user_cache_dir, ignore_errors=True)
+
+        def load():
+            errors = []
+            load_resources(app_dir, [], deploy_ctx, errors)
+            assert not errors, errors[:5]
+
+        def load_and_render():
+            _, errors = generate({}, app_dir, [], deploy_ctx)
+            assert not errors, errors[:5]
+
+        measure('load', load, args.repeat, clear_caches)
+
+        if FragmentRenderer is not None:
+            clear_caches()
+            resources_data = load_resources(app_dir, [], deploy_ctx, [])
+            jenv = Environment(loader=FileSystemLoader(Path(easysam.generate.__file__).parent))
+            sam_template = jenv.get_template('template.j2')
+            fragment_cache = DiskCache(Path(tmp, 'fragments'))
+
+            def render(cache=None):
+                context = render_context(resources_data)
+                fragments = FragmentRenderer(jenv, context, cache, 'template.yml')
+                sam_template.render(dict(context, fragment=fragments))
+
+            def render_cached():
+                render(fragment_cache)
+
+            def render_native():
+                ''.join(emit_template(build_template(render_context(resources_data))))
+
+            measure('render', render, args.repeat)
+            render_cached()
+            measure('cached', render_cached, args.repeat)
+            measure('native', render_native, args.repeat)
+
+        measure('generate', load_and_render, args.repeat, clear_caches)
+
+
+if __name__ == '__main__':
+    main()
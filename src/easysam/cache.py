@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging as lg
+import os
+import pickle
+import tempfile
+from functools import cache
+from pathlib import Path
+from typing import Any, Iterable
+
+
+CACHE_DIR = '.easysam-cache'
+
+# Read once at import, as reading the umask requires setting it
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+
+
+def cache_root(resources_dir: Path) -> Path:
+    """Return the root of the on-disk cache of an application."""
+    return Path(resources_dir, 'build', CACHE_DIR)
+
+
+def user_cache_dir() -> Path:
+    """Return the per-user cache directory of EasySAM, shared by all applications."""
+    if cache_dir := os.environ.get('EASYSAM_CACHE_DIR'):
+        return Path(cache_dir)
+
+    if os.name == 'nt' and (local_app_data := os.environ.get('LOCALAPPDATA')):
+        return Path(local_app_data, 'easysam', 'Cache')
+
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache', 'easysam')
+
+
+def app_cache(resources_dir: Path, name: str, cliparams: dict | None = None) -> 'DiskCache | None':
+    """Return a named on-disk cache of an application, or None if caching is disabled by `--no-cache`."""
+    if (cliparams or {}).get('no_cache'):
+        return None
+
+    return DiskCache(Path(cache_root(resources_dir), name))
+
+
+def digest(*parts: Any) -> str:
+    """Compute a stable hash of the given JSON-serializable parts and bytes."""
+    hasher = hashlib.sha256()
+
+    for part in parts:
+        if isinstance(part, bytes):
+            hasher.update(part)
+        else:
+            hasher.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+
+        hasher.update(b'\0')
+
+    return hasher.hexdigest()
+
+
+@cache
+def package_digest() -> str:
+    """
+    Return a hash of the sources of EasySAM, which salts the keys of the caches.
+
+    Unlike the package version, it changes with the sources of an editable install, and needs no package metadata.
+    """
+    package_dir = Path(__file__).parent
+    sources = sorted(path for path in package_dir.rglob('*') if path.is_file() and '__pycache__' not in path.parts)
+    return digest(*[part for path in sources for part in (path.relative_to(package_dir).as_posix(), path.read_bytes())])
+
+
+def file_digest(path: Path) -> str | None:
+    """Return the SHA-256 hash of the content of a file, or None if the file does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+
+    except FileNotFoundError:
+        return None
+
+
+def write_atomic(path: Path, content: bytes):
+    """Write a file through a temporary file and a rename, so readers never see partial content."""
+    write_stream(path, [content])
+
+
+def write_stream(path: Path, chunks: Iterable[bytes], skip_unchanged: bool = False) -> bool:
+    """
+    Write streamed content to a temporary file and rename it over `path`.
+
+    Args:
+        path: The file to write.
+        chunks: The content, written as it is produced.
+        skip_unchanged: Leave `path` untouched if it already has this content.
+
+    Returns:
+        Whether `path` was replaced.
+    """
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    hasher = hashlib.sha256()
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                hasher.update(chunk)
+                f.write(chunk)
+
+        if skip_unchanged and file_digest(path) == hasher.hexdigest():
+            Path(tmp_name).unlink()
+            return False
+
+        # mkstemp creates private files, give the result the permissions of a regular new file
+        os.chmod(tmp_name, 0o666 & ~UMASK)
+        os.replace(tmp_name, path)
+        return True
+
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class DiskCache:
+    """
+    A persistent key-value cache stored as pickle files.
+
+    Keys are hashes computed by the caller with `digest`. Entries are written
+    atomically, so the cache can be shared between concurrent processes.
+    Any read or write failure is treated as a cache miss.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.salt = package_digest()
+
+    def _entry_path(self, key: str) -> Path:
+        return Path(self.directory, key[:2], f'{key}.pickle')
+
+    def key(self, *parts: Any) -> str:
+        return digest(self.salt, *parts)
+
+    def get(self, key: str) -> Any | None:
+        entry_path = self._entry_path(key)
+
+        try:
+            return pickle.loads(entry_path.read_bytes())
+
+        except FileNotFoundError:
+            return None
+
+        except Exception as e:
+            lg.debug(f'Ignoring unreadable cache entry {entry_path}: {e}')
+            return None
+
+    def put(self, key: str, value: Any):
+        entry_path = self._entry_path(key)
+
+        try:
+            write_atomic(entry_path, pickle.dumps(value))
+
+        except Exception as e:
+            lg.debug(f'Unable to write cache entry {entry_path}: {e}')
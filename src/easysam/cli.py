@@ -1,5 +1,6 @@
 from pathlib import Path
 import logging as lg
+import os
 import sys
 from importlib.metadata import version
 import traceback
@@ -7,8 +8,9 @@ from argparse import ArgumentParser
 
 from benedict import benedict
 import click
+import yaml
 
-from easysam.generate import generate
+from easysam.generate import ENGINES, generate, generate_matrix, matrix_output_dir
 from easysam.deploy import deploy, delete
 from easysam.deploy import remove_common_dependencies
 from easysam.init import init
@@ -29,10 +31,30 @@ from easysam.inspect import inspect
 @click.option('--target-region', type=str, help='A region to use for generation')
 @click.option('--environment', type=str, help='An environment (AWS stack) to use in generation', default='dev')
 @click.option('--verbose', is_flag=True)
-def easysam(ctx, verbose, aws_profile, context_file, target_region, environment):
+@click.option(
+    '--no-cache',
+    is_flag=True,
+    help='Disable all EasySAM caches: the application cache in build/.easysam-cache '
+    'and the compiled templates in the user cache directory',
+)
+@click.option(
+    '--workers',
+    type=click.IntRange(min=0),
+    default=1,
+    help='Number of worker processes used to load import files and generate outputs (0 uses all CPUs)',
+)
+@click.option(
+    '--import-depth',
+    type=click.IntRange(min=0),
+    help='Maximum directory depth below each import directory to search for easysam.yaml files',
+)
+def easysam(ctx, verbose, aws_profile, context_file, target_region, environment, no_cache, workers, import_depth):
     ctx.obj = {
         'verbose': verbose,
         'aws_profile': aws_profile,
+        'no_cache': no_cache,
+        'workers': workers or os.cpu_count(),
+        'import_depth': import_depth,
         'deploy_ctx': {'target_region': target_region, 'environment': environment},
     }
 
@@ -47,30 +69,70 @@ def easysam(ctx, verbose, aws_profile, context_file, target_region, environment)
 @easysam.command(name='generate', help='Generate a SAM template from a directory')
 @click.pass_obj
 @click.option('--path', multiple=True, help='A additional Python path to use for generation')
+@click.option(
+    '--matrix',
+    type=click.Path(exists=True, path_type=Path),
+    help='A YAML file mapping output names to deployment contexts. Each context is generated into build/matrix/<name>',
+)
+@click.option(
+    '--engine',
+    type=click.Choice(ENGINES),
+    default='jinja',
+    help='The engine generating the SAM template: the Jinja template or the native Python emitter',
+)
 @click.argument('directory', type=click.Path(exists=True))
-def generate_cmd(obj, directory, path):
+def generate_cmd(obj, directory, path, matrix, engine):
+    obj['engine'] = engine
     directory = Path(directory)
     pypath = [Path(p) for p in path]
+
+    if matrix:
+        failed = generate_matrix_cmd(obj, directory, pypath, matrix)
+        sys.exit(1 if failed else 0)
+
     deploy_ctx = obj.get('deploy_ctx')
     resources_data, errors = generate(obj, directory, pypath, deploy_ctx)
 
     if errors:
-        for error in errors:
-            lg.error(error)
-
-        if len(errors) > 1:
-            lg.error(f'There were {len(errors)} errors:')
-        else:
-            lg.error('There was an error')
-
+        report_errors(errors)
         sys.exit(1)
 
     else:
-        click.echo(resources_data.to_yaml())
+        click.echo(benedict(resources_data, check_keys=False).to_yaml())
         lg.info('Resources generated successfully')
         sys.exit(0)
 
 
+def generate_matrix_cmd(obj, directory, pypath, matrix):
+    contexts = yaml.safe_load(matrix.read_text(encoding='utf-8'))
+
+    if not isinstance(contexts, dict) or not all(isinstance(c, dict) for c in contexts.values()):
+        raise click.UsageError(f'Matrix file {matrix} must map output names to deployment contexts')
+
+    results = generate_matrix(obj, directory, pypath, contexts)
+    failed = False
+
+    for name, (_, errors) in results.items():
+        if errors:
+            lg.error(f'Matrix entry {name} failed')
+            report_errors(errors)
+            failed = True
+        else:
+            lg.info(f'Matrix entry {name} generated into {matrix_output_dir(directory, name)}')
+
+    return failed
+
+
+def report_errors(errors):
+    for error in errors:
+        lg.error(error)
+
+    if len(errors) > 1:
+        lg.error(f'There were {len(errors)} errors:')
+    else:
+        lg.error('There was an error')
+
+
 @easysam.command(name='deploy', help='Deploy the application to an AWS environment')
 @click.pass_obj
 @click.option('--tag', type=str, multiple=True, help='AWS Tags')
@@ -82,8 +144,17 @@ def generate_cmd(obj, directory, path):
     type=click.Path(exists=True, path_type=Path),
     help='Override the main template',
 )
+@click.option(
+    '--engine',
+    type=click.Choice(ENGINES),
+    default='jinja',
+    help='The engine generating the SAM template: the Jinja template or the native Python emitter',
+)
 @click.argument('directory', type=click.Path(exists=True, path_type=Path))
 def deploy_cmd(obj, directory, **kwargs):
+    if kwargs['engine'] == 'native' and kwargs['override_main_template']:
+        raise click.UsageError('--override-main-template requires the jinja engine')
+
     obj.update(kwargs)  # noqa: F821
     deploy_ctx = obj.get('deploy_ctx')
     deploy(obj, directory, deploy_ctx)
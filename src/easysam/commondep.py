@@ -1,18 +1,84 @@
+import hashlib
 import logging as lg
 from pathlib import Path
 import ast
 
+from easysam.cache import DiskCache
+from easysam.walk import find_files
 
-def commondep(common_base, target_dir):
+
+def commondep(common_base, target_dir, import_cache: 'ImportCache | None' = None):
     common_base = Path(common_base)
     target_dir = Path(target_dir)
     commons = find_commons(common_base)
+    import_cache = import_cache or ImportCache(None)
 
     lg.debug(f'Commons: {commons}')
-    common_imports = find_common_deps(target_dir, common_base, commons, set())
+    common_imports = find_common_deps(target_dir, common_base, commons, set(), import_cache)
     return sorted(list(common_imports))
 
 
+class ImportCache:
+    """
+    The modules imported at the top level of Python files, kept on disk between runs.
+
+    Entries are looked up by path and are valid while the modification time and size of the file
+    are unchanged. Otherwise the file is hashed, and only parsed again if its content changed.
+    """
+
+    def __init__(self, cache: DiskCache | None):
+        self.cache = cache
+        self.key = cache.key('commondep-imports') if cache else None
+        self.entries: dict[str, dict] = (cache.get(self.key) if cache else None) or {}
+        self.changed = False
+        self.parsed = 0
+
+    def imports(self, path: Path) -> list[str]:
+        entry_key = str(Path(path).resolve())
+        entry = self.entries.get(entry_key)
+        stat = path.stat()
+        file_stat = (stat.st_mtime_ns, stat.st_size)
+
+        if entry and entry['stat'] == file_stat:
+            return entry['imports']
+
+        content = path.read_bytes()
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        if entry and entry['hash'] == content_hash:
+            imports = entry['imports']
+        else:
+            imports = parse_imports(content.decode('utf-8'))
+            self.parsed += 1
+
+        self.entries[entry_key] = {'stat': file_stat, 'hash': content_hash, 'imports': imports}
+        self.changed = True
+        return imports
+
+    def save(self):
+        lg.debug(f'Parsed {self.parsed} Python files for common dependencies')
+
+        if self.cache and self.changed:
+            # Forget the files that were removed since they were cached
+            self.entries = {path: entry for path, entry in self.entries.items() if Path(path).exists()}
+            self.cache.put(self.key, self.entries)
+            self.changed = False
+
+
+def parse_imports(code: str) -> list[str]:
+    """Return the modules imported at the top level of Python code."""
+    imports = []
+
+    for stmt in ast.parse(code).body:
+        if isinstance(stmt, ast.Import):
+            imports.extend(sorted(name.name for name in stmt.names))
+
+        if isinstance(stmt, ast.ImportFrom) and stmt.module:
+            imports.append(stmt.module)
+
+    return imports
+
+
 def find_commons(common_base):
     commons = []
 
@@ -41,28 +107,16 @@ def is_common_package(name: str, commons: list[str]) -> str | None:
     return split[1]
 
 
-def find_common_deps_in_file(target_file, common_base, commons, common_imports):
+def find_common_deps_in_file(target_file, common_base, commons, common_imports, import_cache):
     lg.debug(f'Processing {target_file}')
     file_imports = set()
-    target_code = target_file.read_text(encoding='utf-8')
-    target_ast = ast.parse(target_code)
-
-    for stmt in target_ast.body:
-        if isinstance(stmt, ast.Import):
-            for name in sorted(stmt.names, key=lambda x: x.name):
-                lg.debug(f'Found import "{name.name}" in {target_file}')
-
-                if package := is_common_package(name.name, commons):
-                    lg.debug(f'Adding "{package}" to file imports')
-                    file_imports.add(package)
 
-        if isinstance(stmt, ast.ImportFrom):
-            lg.debug(f'Found import from "{stmt.module}" in {target_file}')
+    for name in import_cache.imports(target_file):
+        lg.debug(f'Found import "{name}" in {target_file}')
 
-            if stmt.module:
-                if package := is_common_package(stmt.module, commons):
-                    lg.debug(f'Adding "{package}" to file imports')
-                    file_imports.add(package)
+        if package := is_common_package(name, commons):
+            lg.debug(f'Adding "{package}" to file imports')
+            file_imports.add(package)
 
     lg.debug(f'File imports: {target_file}: {file_imports}')
     new_imports = set(file_imports) - common_imports
@@ -76,17 +130,17 @@ def find_common_deps_in_file(target_file, common_base, commons, common_imports):
         if not dep_file.is_dir():
             dep_file = dep_file.with_suffix('.py')
             lg.debug(f'Processing nested file {dep_file}')
-            find_common_deps_in_file(dep_file, common_base, commons, common_imports)
+            find_common_deps_in_file(dep_file, common_base, commons, common_imports, import_cache)
         else:
             lg.debug(f'Processing nested directory {dep_file}')
-            find_common_deps(dep_file, common_base, commons, common_imports)
+            find_common_deps(dep_file, common_base, commons, common_imports, import_cache)
 
 
-def find_common_deps(target, common_base, commons, common_imports):
-    target_files = sorted(target.glob('**/*.py'), key=lambda x: str(x))
+def find_common_deps(target, common_base, commons, common_imports, import_cache):
+    target_files = find_files(target, '*.py')
     lg.debug(f'For target {target} files are: {target_files}')
 
     for target_file in target_files:
-        find_common_deps_in_file(target_file, common_base, commons, common_imports)
+        find_common_deps_in_file(target_file, common_base, commons, common_imports, import_cache)
 
     return common_imports
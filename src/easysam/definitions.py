@@ -1,7 +1,4 @@
-from benedict import benedict
-
-
-type ProcessingResult = tuple[benedict, list[str]]
+type ProcessingResult = tuple[dict, list[str]]
 
 
 class FatalError(Exception):
@@ -9,8 +9,9 @@ from benedict import benedict
 from rich.live import Live
 from rich.spinner import Spinner
 
+from easysam.cache import app_cache
 from easysam.generate import generate
-from easysam.commondep import commondep
+from easysam.commondep import ImportCache, commondep
 import easysam.utils as u
 
 SAM_CLI_VERSION = '1.138.0'
@@ -41,7 +42,7 @@ def deploy(cliparams: dict, directory: Path, deploy_ctx: benedict):
     check_pip_version(cliparams)
     check_sam_cli_version(cliparams)
     remove_common_dependencies(directory)
-    copy_common_dependencies(directory, resources)
+    copy_common_dependencies(directory, resources, cliparams)
 
     # Building the application from the SAM template
     sam_build(cliparams, directory)
@@ -215,7 +216,7 @@ def remove_common_dependencies(directory):
         shutil.rmtree(common_dep)
 
 
-def copy_common_dependencies(directory, resources):
+def copy_common_dependencies(directory, resources, cliparams: dict | None = None):
     lg.info('Looking for common dependencies')
     common = common_dep_dir(directory)
 
@@ -229,11 +230,13 @@ def copy_common_dependencies(directory, resources):
         lg.warning('No functions found in resources')
         return
 
+    import_cache = ImportCache(app_cache(directory, 'commondep', cliparams))
+
     for lambda_name, lambda_function in resources['functions'].items():
         lambda_path = Path(directory, lambda_function['uri'])
         lambda_common_path = Path(lambda_path, 'common')
         lambda_common_path.mkdir(parents=True, exist_ok=True)
-        deps = commondep(common, lambda_path)
+        deps = commondep(common, lambda_path, import_cache)
 
         lg.info(f'Lambda {lambda_name} has {len(deps)} common dependencies')
         lg.debug(f'Dependencies: {" ".join(deps)}')
@@ -250,3 +253,5 @@ def copy_common_dependencies(directory, resources):
                 lg.debug(f'Copying {dep_filepath} file to {lambda_common_path}')
                 lambda_common_filepath = Path(lambda_common_path, dep_filepath.name)
                 shutil.copy(dep_filepath, lambda_common_filepath)
+
+    import_cache.save()
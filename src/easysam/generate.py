@@ -1,16 +1,42 @@
 from pathlib import Path
+import json
 import traceback
+from itertools import repeat
 import logging as lg
-from typing import cast
+from functools import cache
+from typing import Callable, Iterable, Iterator, cast
 
-from benedict import benedict
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 import yaml
-from mergedeep import merge
 
-from easysam.prismarine import generate as generate_prismarine_clients
+from easysam.prismarine import generate as generate_prismarine_clients, model_worker
+from easysam.cache import DiskCache, app_cache, digest, user_cache_dir, write_stream
 from easysam.definitions import FatalError, ProcessingResult
 from easysam.load import resources as load_resources
+from easysam.native import build_template, emit_template
+from easysam.refs import ResourceIndex
+from easysam.workers import worker_pool
+
+
+MATRIX_DIR = 'matrix'
+
+# The engines generating the SAM template: the Jinja template, or the native emitter of `easysam.native`
+ENGINES = ['jinja', 'native']
+
+# The errors and changed outputs of an output stage
+type StageResult = tuple[list[str], list[Path]]
+
+# An output stage: the label of its errors, and a module-level function and its arguments, so it can run
+# in a worker process
+type Stage = tuple[str, Callable[..., StageResult], tuple]
+
+# The templates rendering one resource of a section, called by the main templates through `fragment`
+FRAGMENT_TEMPLATES = {
+    'functions': 'fragments/function.j2',
+    'tables': 'fragments/table.j2',
+    'buckets': 'fragments/bucket.j2',
+    'paths': 'fragments/swagger_path.j2',
+}
 
 
 def generate(
@@ -18,6 +44,7 @@ def generate(
     resources_dir: Path,
     pypath: list[Path],
     deploy_ctx: dict[str, str],
+    output_dir: Path | None = None,
 ) -> ProcessingResult:
     """
     Generate a SAM template from a directory.
@@ -28,54 +55,24 @@ def generate(
         deploy_ctx: The additional deployment context, including:
         - environment: the name of the environment (AWS stack) to deploy to
         - region: the region to deploy to (AWS region)
+        output_dir: The directory to write the template, Swagger and plugin outputs to
+        (defaults to the resources directory).
 
         A tuple containing the processed resources and any errors as a list.
     """
 
+    output_dir = output_dir or resources_dir
+    changed = []
+
     try:
         errors = []
-        resources_data = load_resources(resources_dir, pypath, deploy_ctx, errors)
+        resources_data = load_resources(resources_dir, pypath, deploy_ctx, errors, cliparams)
 
-        lg.debug('Resources processed:\n' + yaml.dump(resources_data, indent=4))
+        if lg.getLogger().isEnabledFor(lg.DEBUG):
+            lg.debug('Resources processed:\n' + yaml.dump(resources_data, indent=4))
 
         try:
-            build_dir = Path(resources_dir, 'build')
-            swagger = Path(build_dir, 'swagger.yaml')
-            template = Path(resources_dir, 'template.yml')
-
-            if plugins := resources_data.get('plugins'):
-                lg.info('The template has plugins, executing them')
-
-                for plugin_name, plugin in cast(dict, plugins).items():
-                    invoke_plugin(resources_dir, resources_data, plugin_name, plugin, errors)
-
-            searchpath = [
-                str(Path(__file__).parent.resolve()),
-                str(resources_dir.resolve()),
-            ]
-
-            template_path = 'template.j2'
-
-            if omt := cliparams.get('override_main_template'):
-                lg.info(f'Overriding main template with {omt}')
-                template_path = str(omt.name)
-                lg.info(f'Adding {omt.parent} to search path')
-                searchpath.append(str(omt.parent))
-
-            loader = FileSystemLoader(searchpath=searchpath)
-            jenv = Environment(loader=loader)
-
-            sam_template = jenv.get_template(template_path)
-            sam_output = sam_template.render(resources_data)
-
-            write_result(template, sam_output)
-            lg.info(f'SAM template generated: {template}')
-
-            if resources_data.get('paths'):
-                swagger_template = jenv.get_template('swagger.j2')
-                swagger_output = swagger_template.render(resources_data)
-                write_result(swagger, swagger_output)
-                lg.info(f'Swagger file generated: {swagger}')
+            stages = output_stages(resources_dir, resources_data, pypath, errors, output_dir, cliparams)
 
         except Exception as e:
             if cliparams.get('verbose'):
@@ -84,42 +81,438 @@ def generate(
             errors.append(f'Error generating template: {e}')
             return resources_data, errors
 
+        errors_before_stages = len(errors)
+        run_stages(stages, errors, changed, cliparams)
+
         if 'prismarine' in resources_data:
-            lg.info('Generating prismarine clients')
-            generate_prismarine_clients(resources_dir, resources_data, errors)
+            # As when the outputs were generated in turn, a failing output stage stops before the prismarine clients
+            if len(errors) > errors_before_stages:
+                lg.warning('Not generating prismarine clients due to errors generating the outputs')
+            else:
+                generate_clients(resources_dir, resources_data, pypath, errors, cliparams)
+
+        if changed:
+            lg.info(f'Changed outputs: {", ".join(str(path) for path in changed)}')
+        else:
+            lg.info('All outputs are up to date')
 
         return resources_data, errors
 
     except FatalError as e:
-        return benedict(), e.errors
+        return {}, e.errors
 
+    finally:
+        # Discard the prismarine models imported during this run
+        model_worker.release()
 
-def invoke_plugin(
+
+def output_stages(
     resources_dir: Path,
-    resources_data: benedict,
-    plugin_name: str,
-    plugin: benedict,
+    resources_data: dict,
+    pypath: list[Path],
     errors: list[str],
-):
-    template_j2_filename = cast(str, plugin['template'])
-    template_j2_path = Path(resources_dir, template_j2_filename)
+    output_dir: Path,
+    cliparams: dict,
+) -> list[Stage]:
+    """Prepare the independent stages writing the outputs of an application, besides the prismarine clients."""
+
+    stages = []
+
+    if plugins := resources_data.get('plugins'):
+        lg.info('The template has plugins, executing them')
+
+        for plugin_name, plugin in cast(dict, plugins).items():
+            if (plugin_data := plugin_context(resources_dir, resources_data, plugin, errors)) is not None:
+                args = (resources_dir, plugin_data, plugin_name, plugin, output_dir, cliparams)
+                stages.append((f'plugin {plugin_name}', render_plugin, args))
+
+    stages.append(('template', render_sam_template, (resources_dir, resources_data, output_dir, cliparams)))
+
+    if resources_data.get('paths'):
+        stages.append(('Swagger', render_swagger, (resources_dir, resources_data, output_dir, cliparams)))
+
+    return stages
+
+
+def run_stages(stages: list[Stage], errors: list[str], changed: list[Path], cliparams: dict):
+    """
+    Run output stages, in worker processes if more than one worker is requested.
+
+    The errors and changed outputs of the stages are collected in stage order, whichever stage completes first.
+    """
+
+    workers = min(cliparams.get('workers') or 1, len(stages))
+    verbose = bool(cliparams.get('verbose'))
+
+    if workers <= 1:
+        results = [run_stage(label, func, args, verbose) for label, func, args in stages]
+    else:
+        lg.info(f'Generating {len(stages)} outputs with {workers} workers')
+
+        with worker_pool(workers) as executor:
+            results = list(executor.map(run_stage, *zip(*stages), repeat(verbose)))
+
+    for stage_errors, stage_changed in results:
+        errors.extend(stage_errors)
+        changed.extend(stage_changed)
+
+
+def run_stage(label: str, func: Callable[..., StageResult], args: tuple, verbose: bool) -> StageResult:
+    try:
+        return func(*args)
+
+    except Exception as e:
+        if verbose:
+            traceback.print_exc()
+
+        return [f'Error generating {label}: {e}'], []
+
+
+def main_template_environment(resources_dir: Path, cliparams: dict) -> tuple[Environment, str]:
+    """Return the Jinja environment of the SAM and Swagger templates, and the name of the main template."""
+    searchpath = [
+        str(Path(__file__).parent.resolve()),
+        str(resources_dir.resolve()),
+    ]
+
+    template_path = 'template.j2'
+
+    if omt := cliparams.get('override_main_template'):
+        template_path = str(omt.name)
+        searchpath.append(str(omt.parent))
+
+    return jinja_environment(tuple(searchpath), not cliparams.get('no_cache')), template_path
+
+
+def render_sam_template(resources_dir: Path, resources_data: dict, output_dir: Path, cliparams: dict) -> StageResult:
+    if omt := cliparams.get('override_main_template'):
+        lg.info(f'Overriding main template with {omt}')
+        lg.info(f'Adding {omt.parent} to search path')
+
+    template = Path(output_dir, 'template.yml')
+    changed = []
+
+    if cliparams.get('engine') == 'native':
+        write_result(template, emit_template(build_template(render_context(resources_data))), changed)
+        lg.info(f'SAM template generated with the native engine: {template}')
+        return [], changed
+
+    jenv, template_path = main_template_environment(resources_dir, cliparams)
+
+    sam_template = jenv.get_template(template_path)
+    context = render_context(resources_data)
+    fragments = FragmentRenderer(jenv, context, app_cache(resources_dir, 'fragments', cliparams), str(template))
+    write_result(template, sam_template.generate(dict(context, fragment=fragments)), changed)
+    fragments.report()
+    lg.info(f'SAM template generated: {template}')
+    return [], changed
+
+
+def render_swagger(resources_dir: Path, resources_data: dict, output_dir: Path, cliparams: dict) -> StageResult:
+    jenv, _ = main_template_environment(resources_dir, cliparams)
+    swagger = Path(output_dir, 'build', 'swagger.yaml')
+    changed = []
+
+    swagger_template = jenv.get_template('swagger.j2')
+    fragments = FragmentRenderer(jenv, resources_data, app_cache(resources_dir, 'fragments', cliparams), str(swagger))
+    write_result(swagger, swagger_template.generate(dict(resources_data, fragment=fragments)), changed)
+    fragments.report()
+    lg.info(f'Swagger file generated: {swagger}')
+    return [], changed
+
+
+def generate_clients(resources_dir: Path, resources_data: dict, pypath: list[Path], errors: list[str], cliparams: dict):
+    """Generate the prismarine clients, which are not written if there were errors before."""
+    lg.info('Generating prismarine clients')
+    workers = cliparams.get('workers') or 1
+    cache = app_cache(resources_dir, 'prismarine', cliparams)
+    generate_prismarine_clients(resources_dir, resources_data, errors, workers, cache, pypath)
+
+
+@cache
+def jinja_environment(searchpath: tuple[str, ...], bytecode_cache: bool = True) -> Environment:
+    """
+    Return the Jinja environment of a template search path, shared by all renders of the process.
+
+    Compiled templates are kept in the environment and, unless `bytecode_cache` is False, in a bytecode
+    cache in the user cache directory, so a template is only compiled again when its source changes.
+    """
+
+    return Environment(
+        loader=FileSystemLoader(searchpath=list(searchpath)),
+        bytecode_cache=template_bytecode_cache() if bytecode_cache else None,
+    )
+
+
+@cache
+def template_bytecode_cache() -> FileSystemBytecodeCache | None:
+    directory = Path(user_cache_dir(), 'jinja')
+
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    except OSError as e:
+        lg.debug(f'Not caching compiled templates, unable to create {directory}: {e}')
+        return None
+
+    return FileSystemBytecodeCache(str(directory))
+
+
+def render_context(resources_data: dict) -> dict:
+    """
+    Return the context of the SAM template: the resources and the lookup maps used by the template.
+
+    The maps let the template find the table triggers and the API paths of each function
+    without scanning all tables and paths for every function.
+    """
+
+    index = ResourceIndex(resources_data)
+    triggers_by_function = {}
+    paths_by_function = {}
+
+    for ref in index.references_from('tables'):
+        triggers_by_function.setdefault(ref.target, []).append(ref.name)
+
+    for ref in index.references_from('paths'):
+        if ref.field == 'function':
+            paths_by_function.setdefault(ref.target, {})[ref.name] = resources_data['paths'][ref.name]
+
+    return dict(resources_data, triggers_by_function=triggers_by_function, paths_by_function=paths_by_function)
+
+
+class FragmentRenderer:
+    """
+    Render the blocks of single resources of a template, reusing the blocks rendered by previous runs.
+
+    A block is rendered from a fragment template and the part of the context it depends on, and is
+    cached as its own entry under a hash of both, looked up when the block is rendered. So only the
+    resources changed since a previous run are rendered again, and the blocks are never all in memory.
+    """
+
+    def __init__(self, jenv: Environment, context: dict, cache: DiskCache | None = None, output: str = ''):
+        self.jenv = jenv
+        self.context = context
+        self.cache = cache
+        self.output = output
+        self.source_digests: dict[str, str] = {}
+        self.renders = 0
+        self.reused = 0
+
+    def __call__(self, kind: str, name: str) -> str:
+        template_name = FRAGMENT_TEMPLATES[kind]
+        inputs = self.inputs(kind, name)
+
+        # Included response templates are files of the application, not part of the inputs
+        if self.cache is None or 'responseTemplateFile' in inputs.get('path_params', {}):
+            return self.jenv.get_template(template_name).render(inputs)
+
+        # The blocks follow the order of the keys of their inputs, so it is part of the key
+        serialized_inputs = json.dumps(inputs, default=str).encode('utf-8')
+        key = self.cache.key('fragment', self.source_digest(template_name), serialized_inputs)
+        self.renders += 1
+
+        if (text := self.cache.get(key)) is not None:
+            self.reused += 1
+            return text
+
+        text = self.jenv.get_template(template_name).render(inputs)
+        self.cache.put(key, text)
+        return text
+
+    def inputs(self, kind: str, name: str) -> dict:
+        context = self.context
+        inputs = {'prefix': context.get('prefix')}
+
+        if kind == 'functions':
+            inputs['enable_lambda_layer'] = context.get('enable_lambda_layer')
+            inputs['function_name'] = name
+            inputs['function'] = context['functions'][name]
+            inputs['function_triggers'] = context.get('triggers_by_function', {}).get(name, [])
+            inputs['function_paths'] = context.get('paths_by_function', {}).get(name, {})
+        elif kind == 'tables':
+            inputs['table_name'] = name
+            inputs['table'] = context['tables'][name]
+        elif kind == 'buckets':
+            inputs['bucket_name'] = name
+            inputs['bucket'] = context['buckets'][name]
+        else:
+            inputs['original_path_name'] = name
+            inputs['path_params'] = context['paths'][name]
+
+        return inputs
+
+    def source_digest(self, template_name: str) -> str:
+        if template_name not in self.source_digests:
+            source, _, _ = cast(FileSystemLoader, self.jenv.loader).get_source(self.jenv, template_name)
+            self.source_digests[template_name] = digest(source)
+
+        return self.source_digests[template_name]
+
+    def report(self):
+        if self.cache is not None:
+            lg.debug(f'Reused {self.reused} of {self.renders} cached fragments of {self.output}')
+
+
+def matrix_output_dir(resources_dir: Path, name: str) -> Path:
+    return Path(resources_dir, 'build', MATRIX_DIR, name)
+
+
+def generate_matrix_entry(
+    cliparams: dict, resources_dir: Path, pypath: list[Path], name: str, deploy_ctx: dict[str, str]
+) -> ProcessingResult:
+    output_dir = matrix_output_dir(resources_dir, name)
+    lg.info(f'Generating matrix entry {name} into {output_dir}')
+    return generate(cliparams, resources_dir, pypath, deploy_ctx, output_dir)
+
+
+def generate_remote_matrix_entry(
+    cliparams: dict, resources_dir: Path, pypath: list[Path], name: str, deploy_ctx: dict[str, str]
+) -> ProcessingResult:
+    # The worker process keeps its model worker for the entries that follow, until the process exits
+    model_worker.keep = True
+    return generate_matrix_entry(cliparams, resources_dir, pypath, name, deploy_ctx)
+
+
+def generate_matrix(
+    cliparams: dict,
+    resources_dir: Path,
+    pypath: list[Path],
+    contexts: dict[str, dict[str, str]],
+) -> dict[str, ProcessingResult]:
+    """
+    Generate the application for several deployment contexts in one process.
+
+    Each entry is written to `build/matrix/<name>` with the same layout as a regular run.
+    With more than one worker, the first entry is generated in this process and the others
+    in worker processes, which reuse the import files it cached unless caching is disabled.
+    Each process keeps its prismarine model worker until all its entries are generated.
+
+    Args:
+        cliparams: The CLI parameters (used: workers).
+        resources_dir: The directory containing the resources.
+        pypath: The Python path to use.
+        contexts: The deployment contexts by matrix entry name.
+
+    Returns:
+        The processing results by matrix entry name.
+    """
+
+    names = list(contexts)
+    workers = cliparams.get('workers') or 1
+    local_names = names if workers <= 1 else names[:1]
+    results = {}
+    model_worker.keep = True
+
+    try:
+        for name in local_names:
+            results[name] = generate_matrix_entry(cliparams, resources_dir, pypath, name, contexts[name])
+
+    finally:
+        model_worker.keep = False
+        model_worker.stop()
+
+    if remote_names := names[len(local_names) :]:
+        worker_cliparams = dict(cliparams, workers=1)
+
+        with worker_pool(workers) as executor:
+            futures = {
+                name: executor.submit(
+                    generate_remote_matrix_entry, worker_cliparams, resources_dir, pypath, name, contexts[name]
+                )
+                for name in remote_names
+            }
+
+            for name, future in futures.items():
+                results[name] = future.result()
+
+    return results
+
+
+def plugin_context(resources_dir: Path, resources_data: dict, plugin: dict, errors: list[str]) -> dict | None:
+    """
+    Return the context of a plugin: the resources overlaid with the auxiliary data of the plugin.
+
+    Returns None, after adding an error, if the plugin template does not exist.
+    """
+
+    template_j2_path = Path(resources_dir, cast(str, plugin['template']))
 
     if not template_j2_path.exists():
         errors.append(f'Plugin {plugin} has no template file {template_j2_path}')
-        return
+        return None
 
     lg.info(f'Invoking plugin {plugin} with template {template_j2_path}')
-    template_dir = template_j2_path.parent
-    loader = FileSystemLoader(searchpath=[str(template_dir.resolve())])
-    jenv = Environment(loader=loader)
+    return overlay(resources_data, plugin.get('aux') or {})
+
+
+def overlay(base: dict, layer: dict) -> dict:
+    """
+    Return `base` with `layer` deep-merged over it, leaving both untouched.
+
+    Nested dictionaries present in both are merged, any other value of `layer` replaces the value
+    of `base`. Only the dictionaries on the paths of the keys of `layer` are copied, shallowly;
+    all other values are shared with `base`, so the cost depends on the size of `layer` only.
+    """
+
+    result = dict(base)
+
+    for key, value in layer.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = overlay(result[key], value)
+        else:
+            result[key] = value
+
+    return result
+
+
+def render_plugin(
+    resources_dir: Path,
+    plugin_data: dict,
+    plugin_name: str,
+    plugin: dict,
+    output_dir: Path,
+    cliparams: dict,
+) -> StageResult:
+    template_j2_filename = cast(str, plugin['template'])
+    template_dir = Path(resources_dir, template_j2_filename).parent
+    jenv = jinja_environment((str(template_dir.resolve()),), not cliparams.get('no_cache'))
     template = jenv.get_template(template_j2_filename)
-    aux_data = dict(plugin.get('aux', {}))
-    output = template.render(merge(resources_data, aux_data))
-    output_yaml_path = Path(resources_dir, plugin_name).with_suffix('.yaml')
-    write_result(output_yaml_path, output)
+    output_yaml_path = Path(output_dir, plugin_name).with_suffix('.yaml')
+    changed = []
+    write_result(output_yaml_path, template.generate(plugin_data), changed)
+    return [], changed
+
+
+def write_result(path: Path, chunks: Iterable[str], changed: list[Path] | None = None):
+    """
+    Write a rendered output without its blank lines, as it is rendered.
+
+    The file is left untouched if it already has this content, so its modification time only
+    changes with its content. Otherwise it is replaced atomically and added to `changed`.
+    """
+
+    def encoded():
+        separator = b''
+
+        for line in non_blank_lines(chunks):
+            yield separator + line.encode('utf-8')
+            separator = b'\n'
+
+    if write_stream(path, encoded(), skip_unchanged=True):
+        if changed is not None:
+            changed.append(path)
+    else:
+        lg.debug(f'Output {path} is unchanged')
+
+
+def non_blank_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Split streamed text into lines like `str.splitlines`, dropping the blank ones."""
+    pending = ''
+
+    for chunk in chunks:
+        *complete, pending = (pending + chunk).split('\n')
 
+        for segment in complete:
+            yield from (line for line in segment.splitlines() if line.strip())
 
-def write_result(path, text):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    sane_text = '\n'.join(line for line in text.splitlines() if line and line.strip())
-    Path(path).write_text(sane_text)
+    yield from (line for line in pending.splitlines() if line.strip())
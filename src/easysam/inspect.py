@@ -5,9 +5,11 @@ import click
 import rich
 from benedict import benedict
 
-from easysam.commondep import commondep
+from easysam.cache import app_cache
+from easysam.commondep import ImportCache, commondep
 from easysam.definitions import FatalError
-from easysam.load import resources as load_resources
+from easysam.load import import_graph, resources as load_resources
+from easysam.refs import SYMBOL_SECTIONS, ResourceIndex
 from easysam.validate_cloud import validate as validate_cloud
 
 
@@ -18,13 +20,17 @@ def inspect(obj):
 
 
 @inspect.command(name='common-deps', help='Inspect a lambda function')
+@click.pass_obj
 @click.option('--common-dir', type=str, default='common', help='The directory containing the common dependencies')
 @click.argument('lambda-dir', type=click.Path(exists=True))
-def common_deps(common_dir, lambda_dir):
+def common_deps(obj, common_dir, lambda_dir):
     common_dir = Path(common_dir)
     lambda_dir = Path(lambda_dir)
 
-    deps = commondep(common_dir, lambda_dir)
+    # The common directory is next to resources.yaml, which is where the application cache is
+    import_cache = ImportCache(app_cache(common_dir.parent, 'commondep', obj))
+    deps = commondep(common_dir, lambda_dir, import_cache)
+    import_cache.save()
     click.echo('Dependencies:')
 
     for dep in deps:
@@ -48,7 +54,7 @@ def schema(obj, directory, path, select):
     deploy_ctx = obj.get('deploy_ctx', {})
 
     try:
-        resources_data = load_resources(directory, pypath, deploy_ctx, errors)
+        resources_data = load_resources(directory, pypath, deploy_ctx, errors, obj)
 
     except FatalError as e:
         lg.error('There were fatal errors. Interrupting schema validation.')
@@ -60,7 +66,8 @@ def schema(obj, directory, path, select):
             rich.print(f'[red]{error}[/red]')
 
     else:
-        slice = resources_data.get(select) if select else resources_data
+        keypath_data = benedict(resources_data, check_keys=False)
+        slice = keypath_data.get(select) if select else keypath_data
 
         if isinstance(slice, benedict):
             rich.print(slice.to_yaml())
@@ -84,7 +91,7 @@ def cloud(obj, directory, path):
     environment = deploy_ctx['environment']
 
     try:
-        resources_data = load_resources(directory, pypath, deploy_ctx, errors)
+        resources_data = load_resources(directory, pypath, deploy_ctx, errors, obj)
 
         if errors:
             rich.print('[red]There were validation errors.[/red] Please run `easysam inspect schema` to fix them.')
@@ -108,3 +115,104 @@ def cloud(obj, directory, path):
             rich.print('[red]There was an error.[/red]')
     else:
         rich.print('[green]Cloud resources are ready.[/green]')
+
+
+@inspect.command(help='Inspect the import files and the imports between them')
+@click.pass_obj
+@click.option('--path', multiple=True, help='Add a path to the Python path')
+@click.argument('directory', type=click.Path(exists=True))
+def imports(obj, directory, path):
+    errors = []
+    directory = Path(directory)
+    pypath = [Path(p) for p in path]
+    deploy_ctx = obj.get('deploy_ctx', {})
+    graph = import_graph(directory, obj)
+
+    try:
+        load_resources(directory, pypath, deploy_ctx, errors, obj, graph)
+
+    except FatalError as e:
+        lg.error('There were fatal errors. Interrupting import inspection.')
+        errors = e.errors
+
+    shown = set()
+
+    def show(entry_path: Path, depth: int, ancestors: frozenset[Path]):
+        line = f'{"  " * depth}* {graph.relative(entry_path)}'
+
+        if entry_path in ancestors:
+            click.echo(f'{line} (cycle)')
+            return
+
+        if entry_path in shown:
+            click.echo(f'{line} (already imported)')
+            return
+
+        shown.add(entry_path)
+
+        if (timing := graph.timings.get(entry_path)) is not None:
+            click.echo(f'{line} ({timing * 1000:.1f} ms)')
+        else:
+            click.echo(f'{line} (not loaded)')
+
+        for imported in graph.imports.get(entry_path, []):
+            show(imported, depth + 1, ancestors | {entry_path})
+
+    click.echo('Import files:')
+
+    for root in graph.roots:
+        show(root, 0, frozenset())
+
+    total = sum(graph.timings.values())
+    click.echo(f'Loaded {len(graph.timings)} import files in {total * 1000:.1f} ms')
+
+    if errors:
+        for error in errors:
+            click.echo(error)
+
+        if len(errors) > 1:
+            rich.print(f'[red]There were {len(errors)} errors.[/red]')
+        else:
+            rich.print('[red]There was an error.[/red]')
+
+
+@inspect.command(help='Inspect the references between the resources')
+@click.pass_obj
+@click.option('--path', multiple=True, help='Add a path to the Python path')
+@click.argument('directory', type=click.Path(exists=True))
+def refs(obj, directory, path):
+    errors = []
+    directory = Path(directory)
+    pypath = [Path(p) for p in path]
+    deploy_ctx = obj.get('deploy_ctx', {})
+
+    try:
+        resources_data = load_resources(directory, pypath, deploy_ctx, errors, obj)
+
+    except FatalError as e:
+        lg.error('There were fatal errors. Interrupting reference inspection.')
+        rich.print(f'[red]There were {len(e.errors)} errors.[/red]')
+        return
+
+    index = ResourceIndex(resources_data)
+
+    for section in SYMBOL_SECTIONS:
+        if not index.symbols[section]:
+            continue
+
+        click.echo(f'{section}:')
+
+        for name in sorted(index.symbols[section]):
+            click.echo(f'* {name}')
+
+            for ref in index.references_to(section, name):
+                click.echo(f'  - {ref.kind}.{ref.name} ({ref.field})')
+
+    if unresolved := index.unresolved():
+        rich.print(f'[red]There were {len(unresolved)} unresolved references.[/red]')
+
+        for ref in unresolved:
+            rich.print(f'[red]{ref}[/red]')
+
+    if errors:
+        rich.print(f'[red]There were {len(errors)} validation errors.[/red] Run `easysam inspect schema` to see them.')
@@ -3,19 +3,26 @@ from pathlib import Path
 from typing import Any
 
 import os
+import re
+import time
+from functools import cache, lru_cache
+from itertools import repeat
 
 from benedict import benedict
 from dotenv import load_dotenv
 import yaml
 
-import prismarine.prisma_common as prisma_common
-import prismarine.prisma_easysam as prisma_easysam
-
 from easysam.validate_schema import (
+    FAST_VALIDATION_THRESHOLD,
     validate as validate_schema,
     validate_local as validate_local_schema,
 )
 from easysam.definitions import FatalError
+from easysam.cache import DiskCache, app_cache
+from easysam.prismarine import dynamo_tables
+from easysam.refs import ResourceIndex
+from easysam.walk import find_files
+from easysam.workers import worker_pool
 
 
 IMPORT_FILE = 'easysam.yaml'
@@ -36,21 +43,19 @@ SUPPORTED_SECTIONS = [
 
 STREAM_INTERVAL_SECONDS = 300
 
+ENV_VAR_REFERENCE = re.compile(r'\$(\w+|\{[^}]*\})')
+
+
+def debug_yaml(title: str, data: Any):
+    if lg.getLogger().isEnabledFor(lg.DEBUG):
+        lg.debug(title)
+        lg.debug(yaml.dump(data, sort_keys=False))
 
-def expand_env_vars(data: Any) -> Any:
-    """Recursively expand environment variables in a dictionary or list."""
-    if isinstance(data, dict):
-        new_dict = {}
-        for k, v in data.items():
-            new_k = os.path.expandvars(k) if isinstance(k, str) else k
-            new_dict[new_k] = expand_env_vars(v)
-        return new_dict
-    elif isinstance(data, list):
-        return [expand_env_vars(item) for item in data]
-    elif isinstance(data, str):
-        return os.path.expandvars(data)
-    else:
-        return data
+
+def referenced_env_vars(text: str) -> dict[str, str | None]:
+    """Return the current values of the environment variables referenced in a text."""
+    names = sorted({name.strip('{}') for name in ENV_VAR_REFERENCE.findall(text)})
+    return {name: os.environ.get(name) for name in names}
 
 
 def resources(
@@ -58,7 +63,9 @@ def resources(
     pypath: list[Path],
     deploy_ctx: dict[str, str],
     errors: list[str],
-) -> benedict:
+    cliparams: dict | None = None,
+    graph: 'ImportGraph | None' = None,
+) -> dict:
     """
     Load the resources from the resources.yaml file.
 
@@ -67,6 +74,8 @@ def resources(
         pypath: The additional Python path to use.
         deploy_ctx: The deployment context dictionary.
         errors: The list of errors.
+        cliparams: The CLI parameters (e.g. `no_cache`, `workers`, `import_depth`).
+        graph: The import graph to record the import files in. Created from `cliparams` if not given.
 
     Returns:
         A dictionary containing the resources.
@@ -80,29 +89,28 @@ def resources(
         load_dotenv(env_file)
 
     try:
-        yaml.SafeLoader.add_constructor('!Conditional', conditional_constructor)
-        raw_data = yaml.safe_load(Path(resources).read_text(encoding='utf-8'))
-        raw_data = expand_env_vars(raw_data)
-        raw_resources_data = benedict(raw_data)
+        raw_resources_data = load_mapping(Path(resources).read_text(encoding='utf-8'))
     except Exception as e:
         errors.append(f'Error loading resources file {resources}: {e}')
-        return benedict()
+        return {}
 
     lg.info('Resolving conditional resources')
     lg.debug(f'Deployment context: {deploy_ctx}')
-    resources_data = resolve_conditionals(raw_resources_data, deploy_ctx, errors)
-    lg.debug('Resources data after resolving conditionals:')
-    lg.debug(resources_data.to_yaml())
+    resources_data = resolve_conditionals(raw_resources_data, deploy_ctx, errors, expand_env=True)
+    debug_yaml('Resources data after resolving conditionals:', resources_data)
 
     lg.info('Applying overrides')
     apply_overrides(resources_data, deploy_ctx)
 
     lg.info('Processing resources')
     pypath = [resources_dir] + list(pypath)
-    preprocess_resources(deploy_ctx, resources_data, resources_dir, pypath, errors)
+
+    graph = graph or import_graph(resources_dir, cliparams)
+    preprocess_resources(deploy_ctx, resources_data, resources_dir, pypath, errors, graph)
 
     lg.info('Validating resources')
-    validate_schema(resources_dir, resources_data, errors)
+    validation_cache = app_cache(resources_dir, 'validation', cliparams)
+    validate_schema(resources_dir, resources_data, errors, ResourceIndex(resources_data), validation_cache)
 
     lg.info('Adding internal values')
     check_lambda_layer(resources_dir, resources_data)
@@ -120,12 +128,10 @@ def prismarine_dynamo_tables(
 ):
     lg.debug(f'Generating prismarine dynamo tables for {prefix}')
 
+    base_dir = Path(resources_dir, base).resolve()
+
     try:
-        prisma_common.set_path(pypath)
-        base_dir = Path(resources_dir, base).resolve()
-        cluster = prisma_common.get_cluster(base_dir, package)
-        # TODO Amend prismarine to return errors
-        return prisma_easysam.build_dynamo_tables(prefix, cluster)
+        return dynamo_tables(base_dir, package, prefix, pypath)
 
     except Exception as e:
         lg.error(f'Error generating dynamo tables for {prefix}: {e}')
@@ -256,41 +262,236 @@ def preprocess_tables(resources_data: dict, table_def: dict, entry_path: Path, e
         resources_data['tables'][table_name] = table_data
 
 
-def preprocess_file(
-    deploy_ctx: dict[str, str], resources_data: dict, resources_dir: Path, entry_path: Path, errors: list[str]
-):
-    lg.info(f'Processing import file {entry_path}')
+def load_import_file(
+    deploy_ctx: dict[str, str],
+    entry_path: Path,
+    errors: list[str],
+    cache: DiskCache | None = None,
+    fast_validation: bool = False,
+) -> dict | None:
+    """
+    Load, expand, resolve and validate a single import file.
+
+    Fragments that resolved without errors are stored in the cache, keyed by the file content,
+    the values of the environment variables it references and the deployment context.
+    With `fast_validation`, valid files are accepted by the code-generated schema validator.
+
+    Returns:
+        The resolved import file data, or None if the file could not be loaded.
+    """
+
     try:
-        yaml.SafeLoader.add_constructor('!Conditional', conditional_constructor)
-        entry_dir = entry_path.parent
-        entry_data = yaml.safe_load(entry_path.read_text(encoding='utf-8'))
-        entry_data = expand_env_vars(entry_data)
-        raw_entry_data = benedict(entry_data)
+        entry_text = entry_path.read_text(encoding='utf-8')
     except Exception as e:
         errors.append(f'Error loading import file {entry_path}: {e}')
-        return
+        return None
+
+    cache_key = None
+
+    if cache:
+        cache_key = cache.key(entry_text, referenced_env_vars(entry_text), deploy_ctx)
+
+        if (cached_data := cache.get(cache_key)) is not None:
+            lg.debug(f'Using cached import file {entry_path}')
+            return cached_data
+
+    try:
+        raw_entry_data = load_mapping(entry_text)
+    except Exception as e:
+        errors.append(f'Error loading import file {entry_path}: {e}')
+        return None
 
+    file_errors = []
     lg.info('Resolving conditional import file')
     lg.debug(f'Deployment context: {deploy_ctx}')
-    resolved_data = resolve_conditionals(raw_entry_data, deploy_ctx, errors)
-    lg.debug('Resources data after resolving conditionals:')
-    lg.debug(resolved_data.to_yaml())
+    resolved_data = resolve_conditionals(raw_entry_data, deploy_ctx, file_errors, expand_env=True)
+    debug_yaml('Resources data after resolving conditionals:', resolved_data)
+
+    validate_local_schema(entry_path, resolved_data, file_errors, fast_validation)
+
+    if cache_key and not file_errors:
+        cache.put(cache_key, resolved_data)
+
+    errors.extend(file_errors)
+    return resolved_data
+
+
+def load_import_file_task(
+    deploy_ctx: dict[str, str], entry_path: Path, cache: DiskCache | None, fast_validation: bool = False
+) -> tuple[dict | None, list[str], bool, float]:
+    """
+    Load an import file, possibly in a worker process.
+
+    Returns:
+        A tuple of the resolved data, the errors, whether one of the errors was fatal
+        and the time spent loading the file in seconds.
+    """
 
-    validate_local_schema(entry_path, resolved_data, errors)
+    errors = []
+    start = time.perf_counter()
 
-    if lambda_def := resolved_data.get('lambda'):
+    try:
+        entry_data = load_import_file(deploy_ctx, entry_path, errors, cache, fast_validation)
+        return entry_data, errors, False, time.perf_counter() - start
+    except FatalError as e:
+        return None, e.errors, True, time.perf_counter() - start
+
+
+class ImportGraph:
+    """
+    The import files of an application and the imports between them.
+
+    Every import file is loaded and merged at most once per run. A file reached again through
+    another import is skipped, and a file reached from one of its own imports is reported as
+    an import cycle. Files are identified by their resolved path.
+    """
+
+    def __init__(
+        self,
+        resources_dir: Path,
+        cache: DiskCache | None = None,
+        workers: int = 1,
+        max_depth: int | None = None,
+    ):
+        self.resources_dir = Path(resources_dir).resolve()
+        self.cache = cache
+        self.workers = workers
+        self.max_depth = max_depth
+        self.roots: list[Path] = []
+        self.imports: dict[Path, list[Path]] = {}
+        self.timings: dict[Path, float] = {}
+        self.cycles: list[list[Path]] = []
+        self.loaded: dict[Path, dict | None] = {}
+        self.merged: set[Path] = set()
+        self.stack: list[Path] = []
+
+    def relative(self, path: Path) -> str:
+        """Return a path relative to the resources directory, for display."""
+        return os.path.relpath(path, self.resources_dir)
+
+    def load(self, deploy_ctx: dict[str, str], entry_paths: list[Path], errors: list[str]):
+        """
+        Load the import files that were not loaded yet, in parallel if more than one worker is requested.
+
+        The errors are reported in the order of `entry_paths` regardless of the order in which
+        the workers complete.
+        """
+
+        pending = {}
+
+        for entry_path in entry_paths:
+            key = entry_path.resolve()
+
+            if key not in self.loaded and key not in pending:
+                pending[key] = entry_path
+
+        if not pending:
+            return
+
+        # Compiling the fast validator only pays off for large batches
+        fast_validation = len(pending) > FAST_VALIDATION_THRESHOLD
+        tasks_args = (repeat(deploy_ctx), pending.values(), repeat(self.cache), repeat(fast_validation))
+
+        if self.workers <= 1 or len(pending) <= 1:
+            self.collect(pending, map(load_import_file_task, *tasks_args), errors)
+            return
+
+        lg.info(f'Loading {len(pending)} import files with {self.workers} workers')
+
+        with worker_pool(self.workers) as executor:
+            chunksize = max(1, len(pending) // (self.workers * 4))
+            self.collect(pending, executor.map(load_import_file_task, *tasks_args, chunksize=chunksize), errors)
+
+    def collect(self, pending: dict[Path, Path], results, errors: list[str]):
+        for key, (entry_data, file_errors, fatal, elapsed) in zip(pending, results):
+            errors.extend(file_errors)
+
+            if fatal:
+                raise FatalError(errors)
+
+            self.loaded[key] = entry_data
+            self.timings[key] = elapsed
+
+
+def import_graph(resources_dir: Path, cliparams: dict | None = None) -> ImportGraph:
+    """Create the import graph of an application, configured from the CLI parameters."""
+    cache = app_cache(resources_dir, 'imports', cliparams)
+    cliparams = cliparams or {}
+    return ImportGraph(resources_dir, cache, cliparams.get('workers') or 1, cliparams.get('import_depth'))
+
+
+def merge_import_file(
+    deploy_ctx: dict[str, str],
+    resources_data: dict,
+    resources_dir: Path,
+    entry_path: Path,
+    entry_data: dict,
+    errors: list[str],
+    graph: ImportGraph,
+):
+    lg.info(f'Processing import file {entry_path}')
+    entry_dir = entry_path.parent
+
+    if lambda_def := entry_data.get('lambda'):
         preprocess_lambda(resources_data, resources_dir, lambda_def, entry_path, entry_dir, errors)
 
-    if tables_def := resolved_data.get('tables'):
+    if tables_def := entry_data.get('tables'):
         preprocess_tables(resources_data, tables_def, entry_path, errors)
 
-    if local_import_def := resolved_data.get('import'):
+    if local_import_def := entry_data.get('import'):
         for import_file in local_import_def:
             import_path = Path(entry_dir, import_file)
-            preprocess_file(deploy_ctx, resources_data, resources_dir, import_path, errors)
+            preprocess_file(deploy_ctx, resources_data, resources_dir, import_path, errors, graph, entry_path)
+
+
+def preprocess_file(
+    deploy_ctx: dict[str, str],
+    resources_data: dict,
+    resources_dir: Path,
+    entry_path: Path,
+    errors: list[str],
+    graph: ImportGraph,
+    importer: Path | None = None,
+):
+    key = entry_path.resolve()
+
+    if importer is not None:
+        graph.imports.setdefault(importer.resolve(), []).append(key)
+
+    if key in graph.stack:
+        cycle = graph.stack[graph.stack.index(key) :] + [key]
+        graph.cycles.append(cycle)
+        errors.append(f'Import cycle: {" -> ".join(graph.relative(path) for path in cycle)}')
+        return
+
+    if key in graph.merged:
+        lg.debug(f'Import file {entry_path} was already imported')
+        return
+
+    graph.merged.add(key)
+    graph.load(deploy_ctx, [entry_path], errors)
+
+    if (entry_data := graph.loaded[key]) is None:
+        return
+
+    graph.stack.append(key)
+
+    try:
+        merge_import_file(deploy_ctx, resources_data, resources_dir, entry_path, entry_data, errors, graph)
+    finally:
+        graph.stack.pop()
+
 
+def preprocess_imports(
+    deploy_ctx: dict[str, str],
+    resources_data: dict,
+    resources_dir: Path,
+    errors: list[str],
+    graph: ImportGraph | None = None,
+):
+    graph = graph or ImportGraph(resources_dir)
+    entry_paths = []
 
-def preprocess_imports(deploy_ctx: dict[str, str], resources_data: dict, resources_dir: Path, errors: list[str]):
     for import_dir_str in resources_data.get('import', []):
         import_dir = Path(resources_dir, import_dir_str)
         lg.info(f'Processing import directory {import_dir}')
@@ -299,8 +500,13 @@ def preprocess_imports(deploy_ctx: dict[str, str], resources_data: dict, resourc
             errors.append(f'Import directory {import_dir} not found')
             continue
 
-        for entry_path in import_dir.glob(f'**/{IMPORT_FILE}'):
-            preprocess_file(deploy_ctx, resources_data, resources_dir, entry_path, errors)
+        entry_paths.extend(find_files(import_dir, IMPORT_FILE, graph.max_depth))
+
+    graph.roots = list(dict.fromkeys(entry_path.resolve() for entry_path in entry_paths))
+    graph.load(deploy_ctx, entry_paths, errors)
+
+    for entry_path in entry_paths:
+        preprocess_file(deploy_ctx, resources_data, resources_dir, entry_path, errors, graph)
 
 
 def process_default_functions(resources_data: dict, errors: list[str]):
@@ -390,7 +596,12 @@ def preprocess_defaults(resources_data: dict, errors: list[str]):
 
 
 def preprocess_resources(
-    deploy_ctx: dict[str, str], resources_data: dict, resources_dir: Path, pypath: list[Path], errors: list[str]
+    deploy_ctx: dict[str, str],
+    resources_data: dict,
+    resources_dir: Path,
+    pypath: list[Path],
+    errors: list[str],
+    graph: ImportGraph | None = None,
 ):
     def sort_dict(d):
         return dict(sorted(d.items(), key=lambda x: x[0]))
@@ -399,7 +610,7 @@ def preprocess_resources(
         preprocess_prismarine(deploy_ctx, resources_data, resources_dir, pypath, errors)
 
     if 'import' in resources_data:
-        preprocess_imports(deploy_ctx, resources_data, resources_dir, errors)
+        preprocess_imports(deploy_ctx, resources_data, resources_dir, errors, graph)
 
     preprocess_defaults(resources_data, errors)
 
@@ -418,11 +629,81 @@ def check_lambda_layer(resources_dir: Path, resources_data: dict):
     resources_data['enable_lambda_layer'] = thirdparty_dir.exists()
 
 
+class Condition:
+    """
+    A compiled condition on a deployment context value.
+
+    The value is either `any`, a single alternative or a list of alternatives. An alternative
+    prefixed with `~` matches any context value except the given one. Results are memoized
+    per context value.
+    """
+
+    def __init__(self, name: str, value: str | tuple):
+        self.name = name
+        self.value = value
+        alternatives = list(flatten_alternatives(value))
+
+        if 'any' in alternatives:
+            self.alternatives = None
+        else:
+            self.alternatives = [(v.lstrip('~'), v.startswith('~')) for v in alternatives]
+
+        self.results: dict[str, bool] = {}
+
+    def __repr__(self):
+        return f'Condition({self.name}={self.value})'
+
+    def check(self, deploy_ctx: dict[str, str], errors: list[str]) -> bool:
+        if self.alternatives is None:
+            return True
+
+        context_value = deploy_ctx.get(self.name)
+
+        if context_value is None:
+            errors.append(
+                f'Fatal error: Condition "{self.name}" not found in deployment context. '
+                f'Unable to resolve conditional resources. Consider adding "--{self.name}"'
+            )
+
+            raise FatalError(errors)
+
+        result = self.results.get(context_value)
+
+        if result is None:
+            result = any((value == context_value) != negate for value, negate in self.alternatives)
+            self.results[context_value] = result
+            lg.debug(f'Condition "{self.name}" {self.value} (condition) == {context_value} (context): {result}')
+
+        return result
+
+
+def flatten_alternatives(value: str | list | tuple):
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            yield from flatten_alternatives(item)
+    else:
+        yield value
+
+
+@cache
+def compile_condition(name: str, value: str | tuple) -> Condition:
+    return Condition(name, value)
+
+
+def condition(name: str, value: str | list) -> Condition:
+    """Return the shared compiled condition for a name and a value."""
+    if isinstance(value, list):
+        value = tuple(flatten_alternatives(value))
+
+    return compile_condition(name, value)
+
+
 class Conditional:
     def __init__(self, key, environment='any', region='any'):
         self.key = key
         self.environment = environment
         self.region = region
+        self.conditions = [condition('environment', environment), condition('target_region', region)]
 
     def __repr__(self):
         fields = [
@@ -435,7 +716,7 @@ class Conditional:
 
 
 def conditional_constructor(loader, node):
-    mapping = loader.construct_mapping(node)
+    mapping = loader.construct_mapping(node, deep=True)
 
     if 'key' not in mapping:
         raise ValueError('All !Conditional keys must have a key')
@@ -443,66 +724,107 @@ def conditional_constructor(loader, node):
     return Conditional(**mapping)
 
 
-def check_condition(condition: str, value: list | str, deploy_ctx: dict[str, str], errors: list[str]):
-    if value == 'any':
-        return True
+class Loader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+    """
+    A safe YAML loader for EasySAM files, backed by libyaml when it is available.
 
-    if isinstance(value, list):
-        return any(check_condition(condition, v, deploy_ctx, errors) for v in value)
+    The `!Conditional` tag is registered on this class only, so other users
+    of `yaml.SafeLoader` in the same process are not affected.
+    """
 
-    context_value = deploy_ctx.get(condition)
 
-    if context_value is None:
-        errors.append(
-            f'Fatal error: Condition "{condition}" not found in deployment context. '
-            f'Unable to resolve conditional resources. Consider adding "--{condition}"'
-        )
+class PythonLoader(yaml.SafeLoader):
+    """The pure-Python equivalent of `Loader`, whose syntax errors quote the offending source line."""
 
-        raise FatalError(errors)
 
-    negate = value.startswith('~')
-    value = value.lstrip('~')
+Loader.add_constructor('!Conditional', conditional_constructor)
+PythonLoader.add_constructor('!Conditional', conditional_constructor)
 
-    lg.info(f'Checking condition "{condition}" {value} (condition) == {context_value} (context) (negate={negate})')
 
-    return (value == context_value) != negate
+def load_yaml(text: str) -> Any:
+    try:
+        return yaml.load(text, Loader=Loader)
 
+    except yaml.MarkedYAMLError:
+        if issubclass(Loader, yaml.SafeLoader):
+            raise
 
-def resolve_conditionals(resources_data, deploy_ctx: dict[str, str], errors: list[str]):
+        # libyaml errors have no source snippet, parse again to raise the detailed error
+        yaml.load(text, Loader=PythonLoader)
+        raise
 
-    if isinstance(resources_data, list):
-        return [resolve_conditionals(item, deploy_ctx, errors) for item in resources_data]
 
-    if not isinstance(resources_data, dict):
-        return resources_data
+@lru_cache(maxsize=4096)
+def load_mapping(text: str) -> dict:
+    """
+    Parse a YAML document that must contain a mapping.
 
-    resolved = benedict()
+    Parsed documents are memoized by content, so that generating several deployment contexts
+    in one process parses each file once. The result is shared and must not be modified;
+    `resolve_conditionals` builds a new tree from it.
+    """
 
-    for key, value in resources_data.items():
-        resolved_value = resolve_conditionals(value, deploy_ctx, errors)
+    data = load_yaml(text)
 
-        if isinstance(key, Conditional):
-            include = all(
-                [
-                    check_condition('environment', key.environment, deploy_ctx, errors),
-                    check_condition('target_region', key.region, deploy_ctx, errors),
-                ]
-            )
+    if not isinstance(data, dict):
+        raise ValueError(f'Expected a mapping at the top level, got {type(data).__name__}')
 
-            if include:
-                resolved[key.key] = resolved_value
-        else:
-            resolved[key] = resolved_value
+    return data
 
-    return resolved
+
+def check_condition(name: str, value: list | str, deploy_ctx: dict[str, str], errors: list[str]) -> bool:
+    return condition(name, value).check(deploy_ctx, errors)
+
+
+def conditional_included(key: Conditional, deploy_ctx: dict[str, str], errors: list[str]) -> bool:
+    return all([c.check(deploy_ctx, errors) for c in key.conditions])
+
+
+def resolve_conditionals(resources_data, deploy_ctx: dict[str, str], errors: list[str], expand_env: bool = False):
+    """
+    Resolve the `!Conditional` keys of a loaded document against the deployment context.
+
+    With `expand_env`, environment variables in string keys and values are expanded in the same
+    traversal. Subtrees under excluded conditional keys are not visited.
+    """
+
+    def resolve(data):
+        if isinstance(data, dict):
+            resolved = {}
+
+            for key, value in data.items():
+                if isinstance(key, Conditional):
+                    if not conditional_included(key, deploy_ctx, errors):
+                        continue
+
+                    key = key.key
+                elif expand_env and isinstance(key, str):
+                    key = os.path.expandvars(key)
+
+                resolved[key] = resolve(value)
+
+            return resolved
+
+        if isinstance(data, list):
+            return [resolve(item) for item in data]
+
+        if expand_env and isinstance(data, str):
+            return os.path.expandvars(data)
+
+        return data
+
+    return resolve(resources_data)
 
 
 def apply_overrides(resources_data: dict, deploy_ctx: dict[str, Any]):
     if 'overrides' in deploy_ctx:
+        # A keypath view on the same underlying dictionary
+        keypath_data = benedict(resources_data, check_keys=False)
+
         for override_path, override_value in deploy_ctx['overrides'].items():
             key = override_path.replace('/', '.')
             lg.info(f'Applying override: {key} = {override_value}')
-            resources_data[key] = override_value
+            keypath_data[key] = override_value
 
 
 def process_default_searches(resources_data: dict, errors: list[str]):
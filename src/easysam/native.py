@@ -0,0 +1,1002 @@
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Iterator
+
+try:
+    from _json import make_encoder as c_make_encoder
+except ImportError:
+    c_make_encoder = None
+
+
+# The Jinja templates this emitter mirrors, and the digest of their sources it was last checked against.
+# The tests fail when the templates change, until the emitter is updated to match and the digest with it.
+MIRRORED_TEMPLATES = ('template.j2', 'fragments/function.j2', 'fragments/table.j2', 'fragments/bucket.j2')
+MIRRORED_TEMPLATES_DIGEST = 'a717def6baeb75edbda33acea35d5c8f73a7303bec5c435ebe9192c4b2ac3d60'
+
+STREAM_VIEW_TYPES = {
+    'keys-only': 'KEYS_ONLY',
+    'new': 'NEW_IMAGE',
+    'old': 'OLD_IMAGE',
+    'new-and-old': 'NEW_AND_OLD_IMAGES',
+}
+
+STREAM_STARTING_POSITIONS = {
+    'trim-horizon': 'TRIM_HORIZON',
+    'latest': 'LATEST',
+}
+
+POLICY_VERSION = '2012-10-17'
+DEFAULT_PYTHON = '3.13'
+DEFAULT_REAUTHORIZE_SECONDS = 300
+DEFAULT_DELIVERY_INTERVAL_SECONDS = 300
+
+ACCESS_LOG_FORMAT = (
+    '{"requestTime":"$context.requestTime","requestId":"$context.requestId","httpMethod":"$context.httpMethod",'
+    '"path":"$context.path","resourcePath":"$context.resourcePath","status":$context.status,'
+    '"responseLatency":$context.responseLatency}'
+)
+
+CORS_METHODS = ['GET', 'PUT', 'HEAD', 'POST', 'DELETE']
+
+SERVICE_POLICIES = {
+    'comprehend': {'ComprehendBasicAccessPolicy': {}},
+    'bedrock': {
+        'Version': POLICY_VERSION,
+        'Statement': [
+            {
+                'Effect': 'Allow',
+                'Action': ['bedrock:InvokeModel', 'bedrock:InvokeModelWithResponseStream'],
+                'Resource': '*',
+            }
+        ],
+    },
+    'mqtt': {
+        'Version': POLICY_VERSION,
+        'Statement': [{'Effect': 'Allow', 'Action': ['iot:Publish', 'iot:DescribeEndpoint'], 'Resource': '*'}],
+    },
+    'budget': {
+        'Version': POLICY_VERSION,
+        'Statement': [
+            {
+                'Sid': 'CostExplorerRead',
+                'Effect': 'Allow',
+                'Action': ['ce:GetCostAndUsage', 'ce:GetCostForecast', 'ce:GetAnomalies'],
+                'Resource': '*',
+            },
+            {
+                'Sid': 'BudgetsRead',
+                'Effect': 'Allow',
+                'Action': ['budgets:ViewBudget', 'budgets:DescribeBudget'],
+                'Resource': '*',
+            },
+        ],
+    },
+}
+
+
+def ref(name: str) -> dict:
+    return {'Ref': name}
+
+
+def sub(text: str) -> dict:
+    return {'Fn::Sub': text}
+
+
+def get_att(name: str, attribute: str) -> dict:
+    return {'Fn::GetAtt': [name, attribute]}
+
+
+def logical_id(name: str) -> str:
+    return name.replace('-', '')
+
+
+def build_template(context: dict) -> dict:
+    """
+    Build the SAM template of an application as a dictionary, without Jinja.
+
+    The result is equivalent to rendering `template.j2`: the same resources, properties and
+    values, with intrinsic functions in their long form. Comments are not kept. `template.j2`
+    remains the reference template: a change there must be mirrored here.
+
+    Args:
+        context: The render context of the SAM template, as returned by `generate.render_context`.
+    """
+
+    prefix = context['prefix']
+    lprefix = prefix.lower()
+    python = context.get('python', DEFAULT_PYTHON)
+    global_variables = {'ENV': ref('Stage'), 'ACCOUNT_ID': ref('AWS::AccountId')}
+    global_variables.update(context.get('envvars') or {})
+
+    template = {
+        'AWSTemplateFormatVersion': '2010-09-09',
+        'Transform': 'AWS::Serverless-2016-10-31',
+        'Description': f'{prefix}\n',
+        'Parameters': {'Stage': {'Type': 'String', 'Default': 'dev'}},
+        'Globals': {
+            'Function': {
+                'Runtime': f'python{python}',
+                'Handler': 'index.handler',
+                'Architectures': ['x86_64'],
+                'Timeout': 30,
+                'Environment': {'Variables': global_variables},
+            },
+            'Api': {
+                'Cors': {
+                    'AllowOrigin': "'*'",
+                    'AllowHeaders': "'*'",
+                    'AllowMethods': "'*'",
+                    'AllowCredentials': False,
+                }
+            },
+        },
+    }
+
+    resources = {}
+
+    if 'paths' in context:
+        resources.update(api_resources(context.get('authorizers')))
+
+    if 'streams' in context:
+        resources.update(delivery_stream_access_resources(lprefix, context['streams']))
+
+    if 'tables' in context:
+        resources['GatewayDynamoRole'] = gateway_dynamo_role()
+
+    if 'queues' in context:
+        resources['GatewaySQSRole'] = gateway_sqs_role(context.get('authorizers') or {})
+
+    for stream_name, stream in (context.get('streams') or {}).items():
+        resources.update(stream_resources(lprefix, stream_name, stream))
+
+    for bucket_name, bucket in (context.get('buckets') or {}).items():
+        resources.update(bucket_resources(lprefix, bucket_name, bucket))
+
+    for queue_name in context.get('queues') or {}:
+        resources[f'{lprefix}{logical_id(queue_name)}Queue'] = {
+            'Type': 'AWS::SQS::Queue',
+            'Properties': {'QueueName': sub(f'{lprefix}-{queue_name}-${{Stage}}')},
+        }
+
+    for table_name, table in (context.get('tables') or {}).items():
+        resources[f'{prefix}{table_name}'] = table_resource(prefix, table_name, table)
+
+    if context.get('enable_lambda_layer'):
+        resources['PythonLambdaLayer'] = lambda_layer_resource(lprefix, python)
+
+    triggers_by_function = context.get('triggers_by_function') or {}
+    paths_by_function = context.get('paths_by_function') or {}
+
+    for function_name, function in (context.get('functions') or {}).items():
+        resources[f'{logical_id(function_name)}Function'] = function_resource(
+            prefix,
+            function_name,
+            function,
+            context.get('enable_lambda_layer'),
+            triggers_by_function.get(function_name, []),
+            paths_by_function.get(function_name, {}),
+        )
+
+    for table_name, table in (context.get('tables') or {}).items():
+        if table.get('trigger'):
+            resources[f'{logical_id(table_name)}StreamEventSourceMapping'] = event_source_mapping(
+                prefix, table_name, table['trigger']
+            )
+
+    if 'search' in context:
+        for collection_name in context['search'] or {}:
+            resources.update(search_resources(lprefix, collection_name, context['functions']))
+
+    if 'mqtt' in context:
+        resources.update(mqtt_resources(lprefix, context['mqtt']))
+
+    template['Resources'] = resources or None
+    url_functions = [name for name, function in (context.get('functions') or {}).items() if 'functionurl' in function]
+
+    if url_functions:
+        template['Outputs'] = {
+            f'{logical_id(name)}FunctionUrl': {
+                'Description': f'Function URL for {name}',
+                'Value': ref(f'{logical_id(name)}FunctionUrl'),
+            }
+            for name in url_functions
+        }
+
+    return template
+
+
+def emit_template(template: dict) -> Iterator[str]:
+    """
+    Serialize a template as JSON, which is also valid YAML.
+
+    Each top-level entry, resource and output is written on a line of its own by the C JSON encoder,
+    which is several times faster than the indenting encoder and keeps the template diffable.
+    """
+
+    yield '{'
+
+    for i, (key, value) in enumerate(template.items()):
+        yield ',\n' if i else '\n'
+
+        if key in ('Resources', 'Outputs') and value:
+            entries = ',\n'.join(f'    {dumps(name)}: {dumps(item)}' for name, item in value.items())
+            yield f'  {dumps(key)}: {{\n{entries}\n  }}'
+        else:
+            yield f'  {dumps(key)}: {dumps(value)}'
+
+    yield '\n}\n'
+
+
+class TemplateEncoder(json.JSONEncoder):
+    """
+    A compact JSON encoder that always uses the C accelerator when it is available.
+
+    python-benedict switches the accelerator of the json module off for the whole process on import,
+    which makes the standard encoder several times slower.
+    """
+
+    def iterencode(self, o, _one_shot=False):
+        if c_make_encoder is None:
+            return super().iterencode(o, _one_shot)
+
+        return c_make_encoder(
+            {}, self.default, encode_basestring_ascii, None, self.key_separator, self.item_separator, False, False, True
+        )(o, 0)
+
+
+dumps = TemplateEncoder(default=str).encode
+
+
+def api_resources(authorizers: dict | None) -> dict:
+    api_properties = {
+        'OpenApiVersion': '3.0.1',
+        'StageName': ref('Stage'),
+        'AccessLogSetting': {'DestinationArn': get_att('ApiLogGroup', 'Arn'), 'Format': ACCESS_LOG_FORMAT},
+    }
+
+    if authorizers is not None:
+        api_properties['Auth'] = {
+            'Authorizers': {name: api_authorizer(name, params) for name, params in authorizers.items()} or None
+        }
+
+    api_properties['DefinitionBody'] = {
+        'Fn::Transform': {'Name': 'AWS::Include', 'Parameters': {'Location': './build/swagger.yaml'}}
+    }
+
+    return {
+        'ApiGwAccountConfig': {
+            'Type': 'AWS::ApiGateway::Account',
+            'Properties': {'CloudWatchRoleArn': get_att('ApiGatewayLoggingRole', 'Arn')},
+        },
+        'ApiGatewayLoggingRole': {
+            'Type': 'AWS::IAM::Role',
+            'Properties': {
+                'AssumeRolePolicyDocument': {
+                    'Version': POLICY_VERSION,
+                    'Statement': [
+                        {
+                            'Effect': 'Allow',
+                            'Principal': {'Service': ['apigateway.amazonaws.com']},
+                            'Action': 'sts:AssumeRole',
+                        }
+                    ],
+                },
+                'Path': '/',
+                'ManagedPolicyArns': [
+                    sub('arn:${AWS::Partition}:iam::aws:policy/service-role/AmazonAPIGatewayPushToCloudWatchLogs')
+                ],
+            },
+        },
+        'ApiDeployment': {'Type': 'AWS::Serverless::Api', 'Properties': api_properties},
+        'ApiLogGroup': {
+            'Type': 'AWS::Logs::LogGroup',
+            'Properties': {'LogGroupName': sub('apigw-${AWS::StackName}-${Stage}'), 'RetentionInDays': 7},
+        },
+    }
+
+
+def api_authorizer(name: str, params: dict) -> dict:
+    authorizer = {'FunctionArn': get_att(f'{name}Function', 'Arn')}
+    identity = {}
+
+    if 'token' in params:
+        authorizer['FunctionPayloadType'] = 'TOKEN'
+        identity['Header'] = params['token']
+    elif 'headers' in params or 'query' in params:
+        authorizer['FunctionPayloadType'] = 'REQUEST'
+
+        if 'headers' in params:
+            identity['Context'] = ['httpMethod', 'resourcePath']
+            identity['Headers'] = list(params['headers'])
+        else:
+            identity['QueryStrings'] = [params['query']]
+
+    identity['ReauthorizeEvery'] = params.get('ttl', DEFAULT_REAUTHORIZE_SECONDS)
+    authorizer['Identity'] = identity
+    return authorizer
+
+
+def delivery_stream_access_resources(lprefix: str, streams: dict) -> dict:
+    bucket_arns = []
+
+    for stream in streams.values():
+        for bucket in (stream.get('buckets') or {}).values():
+            if 'bucketname' in bucket:
+                bucket_arns.append(sub(f'arn:aws:s3:::${{{lprefix}{logical_id(bucket["bucketname"])}Bucket}}/*'))
+            else:
+                bucket_arns.append(f'{bucket.get("extbucketarn")}/*')
+
+    stream_arns = [get_att(f'{lprefix}{logical_id(name)}Stream', 'Arn') for name in streams]
+
+    return {
+        f'{lprefix}DeliveryStreamPolicy': {
+            'Type': 'AWS::IAM::Policy',
+            'Properties': {
+                'Roles': [ref(f'{lprefix}DeliveryStreamRole')],
+                'PolicyName': f'{lprefix}_firehose_delivery_policy',
+                'PolicyDocument': {
+                    'Version': POLICY_VERSION,
+                    'Statement': [
+                        {
+                            'Effect': 'Allow',
+                            'Action': [
+                                's3:AbortMultipartUpload',
+                                's3:GetBucketLocation',
+                                's3:GetObject',
+                                's3:ListBucket',
+                                's3:ListBucketMultipartUploads',
+                                's3:PutObject',
+                            ],
+                            'Resource': bucket_arns or None,
+                        },
+                        {
+                            'Effect': 'Allow',
+                            'Action': [
+                                'kinesis:DescribeStream',
+                                'kinesis:GetShardIterator',
+                                'kinesis:GetRecords',
+                                'kinesis:ListShards',
+                            ],
+                            'Resource': stream_arns or None,
+                        },
+                    ],
+                },
+            },
+        },
+        f'{lprefix}DeliveryStreamRole': {
+            'Type': 'AWS::IAM::Role',
+            'Properties': {
+                'AssumeRolePolicyDocument': {
+                    'Version': POLICY_VERSION,
+                    'Statement': [
+                        {
+                            'Sid': '',
+                            'Effect': 'Allow',
+                            'Principal': {'Service': 'firehose.amazonaws.com'},
+                            'Action': 'sts:AssumeRole',
+                            'Condition': {'StringEquals': {'sts:ExternalId': ref('AWS::AccountId')}},
+                        }
+                    ],
+                }
+            },
+        },
+    }
+
+
+def gateway_dynamo_role() -> dict:
+    return {
+        'Type': 'AWS::IAM::Role',
+        'Properties': {
+            'AssumeRolePolicyDocument': {
+                'Version': POLICY_VERSION,
+                'Statement': [
+                    {
+                        'Action': ['sts:AssumeRole'],
+                        'Effect': 'Allow',
+                        'Principal': {'Service': ['apigateway.amazonaws.com']},
+                    }
+                ],
+            },
+            'Policies': [
+                {
+                    'PolicyName': 'APIGatewayDynamoDBPolicy',
+                    'PolicyDocument': {
+                        'Version': POLICY_VERSION,
+                        'Statement': [
+                            {
+                                'Effect': 'Allow',
+                                'Action': ['dynamodb:PutItem', 'dynamodb:Query', 'dynamodb:GetItem'],
+                                'Resource': '*',
+                            }
+                        ],
+                    },
+                }
+            ],
+        },
+    }
+
+
+def gateway_sqs_role(authorizers: dict) -> dict:
+    authorizer_arns = [get_att(f'{name}Function', 'Arn') for name in authorizers]
+
+    return {
+        'Type': 'AWS::IAM::Role',
+        'Properties': {
+            'AssumeRolePolicyDocument': {
+                'Version': POLICY_VERSION,
+                'Statement': [
+                    {
+                        'Effect': 'Allow',
+                        'Principal': {'Service': ['apigateway.amazonaws.com']},
+                        'Action': ['sts:AssumeRole'],
+                    }
+                ],
+            },
+            'Policies': [
+                {
+                    'PolicyName': 'AllowSqsIntegration',
+                    'PolicyDocument': {
+                        'Version': POLICY_VERSION,
+                        'Statement': [
+                            {
+                                'Effect': 'Allow',
+                                'Action': ['sqs:SendMessage', 'sqs:GetQueueUrl', 'sqs:SendMessageBatch'],
+                                'Resource': '*',
+                            }
+                        ],
+                    },
+                },
+                {
+                    'PolicyName': 'AuthorizerPolicy',
+                    'PolicyDocument': {
+                        'Version': POLICY_VERSION,
+                        'Statement': [
+                            {
+                                'Effect': 'Allow',
+                                'Action': ['lambda:InvokeFunction'],
+                                'Resource': authorizer_arns or None,
+                            }
+                        ],
+                    },
+                },
+            ],
+        },
+    }
+
+
+def stream_resources(lprefix: str, stream_name: str, stream: dict) -> dict:
+    stream_id = f'{lprefix}{logical_id(stream_name)}Stream'
+
+    resources = {
+        stream_id: {
+            'Type': 'AWS::Kinesis::Stream',
+            'Properties': {
+                'Name': sub(f'{lprefix}-{stream_name}-${{Stage}}'),
+                'RetentionPeriodHours': 24,
+                'StreamModeDetails': {'StreamMode': 'ON_DEMAND'},
+            },
+        }
+    }
+
+    for bucket_name, bucket in (stream.get('buckets') or {}).items():
+        if 'bucketname' in bucket:
+            bucket_arn = get_att(f'{lprefix}{bucket["bucketname"]}Bucket', 'Arn')
+        else:
+            bucket_arn = bucket.get('extbucketarn')
+
+        resources[f'{lprefix}{logical_id(stream_name)}{logical_id(bucket_name)}Delivery'] = {
+            'Type': 'AWS::KinesisFirehose::DeliveryStream',
+            'DependsOn': [f'{lprefix}DeliveryStreamPolicy'],
+            'Properties': {
+                'DeliveryStreamName': sub(f'{lprefix}-{stream_name}{bucket_name}-${{Stage}}'),
+                'DeliveryStreamType': 'KinesisStreamAsSource',
+                'KinesisStreamSourceConfiguration': {
+                    'KinesisStreamARN': get_att(stream_id, 'Arn'),
+                    'RoleARN': get_att(f'{lprefix}DeliveryStreamRole', 'Arn'),
+                },
+                'ExtendedS3DestinationConfiguration': {
+                    'BucketARN': bucket_arn,
+                    'BufferingHints': {
+                        'SizeInMBs': 128,
+                        'IntervalInSeconds': bucket.get('intervalinseconds', DEFAULT_DELIVERY_INTERVAL_SECONDS),
+                    },
+                    'CompressionFormat': 'GZIP',
+                    'EncryptionConfiguration': {'NoEncryptionConfig': 'NoEncryption'},
+                    'Prefix': str(bucket.get('bucketprefix', '')),
+                    'RoleARN': get_att(f'{lprefix}DeliveryStreamRole', 'Arn'),
+                },
+            },
+        }
+
+    return resources
+
+
+def bucket_resources(lprefix: str, bucket_name: str, bucket: dict) -> dict:
+    bucket_id = f'{lprefix}{logical_id(bucket_name)}Bucket'
+    objects_arn = sub(f'arn:aws:s3:::${{{bucket_id}}}/*')
+    properties = {'BucketName': sub(f'{lprefix}{bucket_name}-${{Stage}}')}
+    resources = {bucket_id: {'Type': 'AWS::S3::Bucket', 'Properties': properties}}
+
+    if bucket.get('public'):
+        properties['PublicAccessBlockConfiguration'] = {
+            'BlockPublicAcls': False,
+            'BlockPublicPolicy': False,
+            'IgnorePublicAcls': False,
+            'RestrictPublicBuckets': False,
+        }
+        properties['CorsConfiguration'] = {
+            'CorsRules': [{'AllowedHeaders': ['*'], 'AllowedMethods': CORS_METHODS, 'AllowedOrigins': ['*']}]
+        }
+        properties['WebsiteConfiguration'] = {'IndexDocument': 'index.html'}
+
+        public_statements = [
+            ('PublicReadForBucketObjects', 's3:GetObject'),
+            ('PublicPutForBucketObjects', 's3:PutObject'),
+            ('PublicGetObjectAttributes', 's3:GetObjectAttributes'),
+        ]
+
+        resources[f'{bucket_id}Policy'] = {
+            'Type': 'AWS::S3::BucketPolicy',
+            'Properties': {
+                'Bucket': ref(f'{lprefix}{bucket_name}Bucket'),
+                'PolicyDocument': {
+                    'Id': 'PublicReadPolicy',
+                    'Version': POLICY_VERSION,
+                    'Statement': [
+                        {'Sid': sid, 'Effect': 'Allow', 'Principal': '*', 'Action': action, 'Resource': objects_arn}
+                        for sid, action in public_statements
+                    ],
+                },
+            },
+        }
+
+    if 'extaccesspolicy' in bucket:
+        resources[f'{lprefix}{logical_id(bucket_name)}ReadPolicy'] = {
+            'Type': 'AWS::IAM::ManagedPolicy',
+            'Properties': {
+                'ManagedPolicyName': sub(f'{bucket["extaccesspolicy"]}-${{Stage}}'),
+                'PolicyDocument': {
+                    'Version': POLICY_VERSION,
+                    'Statement': [
+                        {'Action': 's3:GetObject', 'Effect': 'Allow', 'Resource': objects_arn},
+                        {
+                            'Action': 's3:ListBucket',
+                            'Effect': 'Allow',
+                            'Resource': sub(f'arn:aws:s3:::${{{bucket_id}}}'),
+                        },
+                    ],
+                },
+            },
+        }
+
+    return resources
+
+
+def key_schema(attributes: list[dict]) -> list[dict]:
+    hash_keys = [{'AttributeName': a['name'], 'KeyType': 'HASH'} for a in attributes if a.get('hash')]
+    range_keys = [{'AttributeName': a['name'], 'KeyType': 'RANGE'} for a in attributes if a.get('range')]
+    return hash_keys + range_keys
+
+
+def table_resource(prefix: str, table_name: str, table: dict) -> dict:
+    attributes = table.get('attributes') or []
+
+    properties = {
+        'TableName': sub(f'{prefix}{table_name}-${{Stage}}'),
+        'AttributeDefinitions': [
+            {'AttributeName': a['name'], 'AttributeType': a['type'] if 'type' in a else 'S'} for a in attributes
+        ]
+        or None,
+        'KeySchema': key_schema(attributes) or None,
+    }
+
+    if indices := table.get('indices'):
+        properties['GlobalSecondaryIndexes'] = [
+            {
+                'IndexName': index['name'],
+                'KeySchema': key_schema(index.get('attributes') or []) or None,
+                'Projection': {'ProjectionType': 'ALL'},
+            }
+            for index in indices
+        ]
+
+    properties['BillingMode'] = 'PAY_PER_REQUEST'
+    properties['PointInTimeRecoverySpecification'] = {
+        'PointInTimeRecoveryEnabled': True,
+        'RecoveryPeriodInDays': 14,
+    }
+
+    if trigger := table.get('trigger'):
+        properties['StreamSpecification'] = {'StreamViewType': STREAM_VIEW_TYPES[trigger['viewtype']]}
+
+    if ttl := table.get('ttl'):
+        properties['TimeToLiveSpecification'] = {'AttributeName': ttl, 'Enabled': True}
+
+    return {'Type': 'AWS::DynamoDB::Table', 'Properties': properties}
+
+
+def lambda_layer_resource(lprefix: str, python: str) -> dict:
+    return {
+        'Type': 'AWS::Serverless::LayerVersion',
+        'Properties': {
+            'LayerName': sub(f'{lprefix}-pythonthirdparty-${{Stage}}'),
+            'Description': 'Dependencies for all python lambdas',
+            'ContentUri': 'thirdparty/.',
+            'CompatibleRuntimes': [f'python{python}'],
+        },
+        'Metadata': {'BuildMethod': f'python{python}', 'BuildArchitecture': 'x86_64'},
+    }
+
+
+def function_url_config(functionurl: bool | dict) -> dict:
+    if isinstance(functionurl, bool):
+        return {'AuthType': 'NONE'}
+
+    config = {'AuthType': functionurl.get('auth_type', 'NONE')}
+
+    if 'invoke_mode' in functionurl:
+        config['InvokeMode'] = functionurl['invoke_mode']
+
+    if 'cors' in functionurl:
+        cors_config = functionurl['cors']
+        cors = {}
+
+        if 'allow_credentials' in cors_config:
+            allow_credentials = cors_config['allow_credentials']
+            cors['AllowCredentials'] = (
+                allow_credentials if isinstance(allow_credentials, bool) else str(allow_credentials).lower()
+            )
+
+        for field, key in [
+            ('allow_headers', 'AllowHeaders'),
+            ('allow_methods', 'AllowMethods'),
+            ('allow_origins', 'AllowOrigins'),
+            ('expose_headers', 'ExposeHeaders'),
+        ]:
+            if field in cors_config:
+                cors[key] = [str(value) for value in cors_config[field]] or None
+
+        if 'max_age' in cors_config:
+            cors['MaxAge'] = cors_config['max_age']
+
+        config['Cors'] = cors or None
+
+    return config
+
+
+def function_policies(prefix: str, function: dict, triggers: list[str]) -> list[dict]:
+    lprefix = prefix.lower()
+
+    policies = [
+        {
+            'AWSSecretsManagerGetSecretValuePolicy': {
+                'SecretArn': sub('arn:aws:secretsmanager:${AWS::Region}:${AWS::AccountId}:secret:*')
+            }
+        },
+        {'SSMParameterReadPolicy': {'ParameterName': '*'}},
+    ]
+
+    for poll in function.get('polls') or []:
+        queue_id = f'{lprefix}{logical_id(poll["name"])}Queue'
+        policies.append({'SQSPollerPolicy': {'QueueName': get_att(queue_id, 'QueueName')}})
+
+    for table in function.get('tables') or []:
+        policies.append({'DynamoDBCrudPolicy': {'TableName': ref(f'{prefix}{table}')}})
+
+    for bucket in function.get('buckets') or []:
+        policies.append({'S3CrudPolicy': {'BucketName': ref(f'{lprefix}{logical_id(bucket)}Bucket')}})
+
+    for stream in function.get('streams') or []:
+        policies.append({'KinesisCrudPolicy': {'StreamName': ref(f'{lprefix}{logical_id(stream)}Stream')}})
+
+    for table_name in triggers:
+        policies.append(
+            {
+                'Version': POLICY_VERSION,
+                'Statement': [
+                    {
+                        'Effect': 'Allow',
+                        'Action': [
+                            'dynamodb:DescribeStream',
+                            'dynamodb:GetRecords',
+                            'dynamodb:GetShardIterator',
+                            'dynamodb:ListStreams',
+                        ],
+                        'Resource': get_att(f'{prefix}{table_name}', 'StreamArn'),
+                    }
+                ],
+            }
+        )
+
+    for queue in function.get('send') or []:
+        policies.append(
+            {'SQSSendMessagePolicy': {'QueueName': get_att(f'{lprefix}{logical_id(queue)}Queue', 'QueueName')}}
+        )
+
+    for service in function.get('services') or []:
+        if service in SERVICE_POLICIES:
+            policies.append(SERVICE_POLICIES[service])
+
+    for collection in function.get('searches') or []:
+        policies.append(
+            {
+                'Version': POLICY_VERSION,
+                'Statement': [
+                    {
+                        'Effect': 'Allow',
+                        'Action': ['aoss:*'],
+                        'Resource': [get_att(f'{logical_id(collection)}Collection', 'Arn')],
+                    }
+                ],
+            }
+        )
+
+    return policies
+
+
+def api_event(path_name: str, path: dict) -> dict:
+    properties = {'Method': 'ANY', 'Path': path_name, 'RestApiId': ref('ApiDeployment')}
+
+    if not path.get('open') and path.get('authorizer'):
+        properties['Auth'] = {'Authorizer': path['authorizer']}
+
+    return {'Type': 'Api', 'Properties': properties}
+
+
+def function_events(lprefix: str, function: dict, paths: dict) -> dict:
+    events = {}
+
+    if schedule := function.get('schedule'):
+        events['InvocationLevel'] = {'Type': 'Schedule', 'Properties': {'Schedule': schedule}}
+
+    for poll in function.get('polls') or []:
+        properties = {'Queue': get_att(f'{lprefix}{logical_id(poll["name"])}Queue', 'Arn')}
+
+        if 'batchsize' in poll:
+            properties['BatchSize'] = poll['batchsize']
+
+        if 'batchwindow' in poll:
+            properties['MaximumBatchingWindowInSeconds'] = poll['batchwindow']
+
+        events[f'{logical_id(poll["name"])}SQSEvent'] = {'Type': 'SQS', 'Properties': properties}
+
+    for path_name, path in paths.items():
+        event_name = path_name.replace('/', '')
+
+        if path.get('greedy'):
+            normalized_path = path_name.rstrip('/') or '/'
+            events[f'{event_name}RootAPI'] = api_event(normalized_path, path)
+            events[f'{event_name}ProxyAPI'] = api_event(f'{normalized_path.rstrip("/")}/{{proxy+}}', path)
+        else:
+            events[f'{event_name}API'] = api_event(path_name, path)
+
+    return events
+
+
+def function_resource(
+    prefix: str,
+    function_name: str,
+    function: dict,
+    enable_lambda_layer: bool | None,
+    triggers: list[str],
+    paths: dict,
+) -> dict:
+    lprefix = prefix.lower()
+    properties = {}
+
+    if 'timeout' in function:
+        properties['Timeout'] = function['timeout']
+
+    if 'memory' in function:
+        properties['MemorySize'] = function['memory']
+
+    properties['FunctionName'] = sub(f'{function_name}-${{Stage}}')
+    properties['CodeUri'] = function.get('uri')
+
+    if 'functionurl' in function:
+        properties['FunctionUrlConfig'] = function_url_config(function['functionurl'])
+
+    properties['Policies'] = function_policies(prefix, function, triggers)
+
+    if enable_lambda_layer or function.get('layers'):
+        layers = [ref('PythonLambdaLayer')] if enable_lambda_layer else []
+        layers.extend(str(arn) for arn in (function.get('layers') or {}).values())
+        properties['Layers'] = layers
+
+    variables = {'REGION': ref('AWS::Region')}
+    variables.update(function.get('envvars') or {})
+
+    for collection in function.get('searches') or []:
+        env_name = f'SEARCH_{collection.replace("-", "_").upper()}_COLLECTION_ID'
+        variables[env_name] = get_att(f'{logical_id(collection)}Collection', 'Id')
+
+    properties['Environment'] = {'Variables': variables}
+
+    if function.get('schedule') or function.get('polls') or paths:
+        properties['Events'] = function_events(lprefix, function, paths)
+
+    return {'Type': 'AWS::Serverless::Function', 'Properties': properties}
+
+
+def event_source_mapping(prefix: str, table_name: str, trigger: dict) -> dict:
+    function_id = f'{logical_id(trigger["function"])}Function'
+
+    properties = {
+        'EventSourceArn': get_att(f'{prefix}{table_name}', 'StreamArn'),
+        'FunctionName': get_att(function_id, 'Arn'),
+        'StartingPosition': STREAM_STARTING_POSITIONS[trigger['startingposition']],
+    }
+
+    if 'batchsize' in trigger:
+        properties['BatchSize'] = trigger['batchsize']
+
+    if 'batchwindow' in trigger:
+        properties['MaximumBatchingWindowInSeconds'] = trigger['batchwindow']
+
+    return {
+        'Type': 'AWS::Lambda::EventSourceMapping',
+        'DependsOn': [function_id, f'{prefix}{table_name}'],
+        'Properties': properties,
+    }
+
+
+def search_resources(lprefix: str, collection_name: str, functions: dict) -> dict:
+    collection_id = logical_id(collection_name)
+    collection = f'{lprefix}-{collection_name}-${{Stage}}'
+
+    # The policies are JSON documents in the exact layout of the block scalars of template.j2
+    encryption_policy = (
+        '{\n'
+        '  "Rules": [\n'
+        '    {\n'
+        '      "ResourceType": "collection",\n'
+        '      "Resource": [\n'
+        f'        "collection/{collection}"\n'
+        '      ]\n'
+        '    }\n'
+        '  ],\n'
+        '  "AWSOwnedKey": true\n'
+        '}\n'
+    )
+
+    network_policy = (
+        '[\n'
+        '  {\n'
+        '    "Rules": [\n'
+        '      {\n'
+        '        "ResourceType": "collection",\n'
+        '        "Resource": [\n'
+        f'          "collection/{collection}"\n'
+        '        ]\n'
+        '      }\n'
+        '    ],\n'
+        '    "AllowFromPublic": true\n'
+        '  }\n'
+        ']\n'
+    )
+
+    # Sorted like the `dictsort` filter of the template
+    searching_functions = sorted(
+        (name for name, function in functions.items() if 'searches' in function), key=str.lower
+    )
+    principals = [f'        "${{{logical_id(name)}FunctionRole.Arn}}"' for name in searching_functions]
+
+    access_policy_lines = [
+        '[',
+        '  {',
+        '    "Description": "Data access for all roles in account",',
+        '    "Rules": [',
+        '      {',
+        '        "ResourceType": "collection",',
+        '        "Resource": [',
+        f'          "collection/{collection}"',
+        '        ],',
+        '        "Permission": ["aoss:*"]',
+        '      },',
+        '      {',
+        '        "ResourceType": "index",',
+        '        "Resource": [',
+        f'          "index/{collection}/*"',
+        '        ],',
+        '        "Permission": ["aoss:*"]',
+        '      }',
+        '    ],',
+        '    "Principal": [',
+        ',\n'.join(principals),
+        '    ]',
+        '  }',
+        ']',
+    ]
+
+    access_policy = ''.join(f'{line}\n' for line in access_policy_lines if line)
+
+    return {
+        f'{collection_id}EP': {
+            'Type': 'AWS::OpenSearchServerless::SecurityPolicy',
+            'Properties': {
+                'Name': sub(f'{lprefix}-{collection_name}-ep-${{Stage}}'),
+                'Type': 'encryption',
+                'Policy': sub(encryption_policy),
+            },
+        },
+        f'{collection_id}NP': {
+            'Type': 'AWS::OpenSearchServerless::SecurityPolicy',
+            'Properties': {
+                'Name': sub(f'{lprefix}-{collection_name}-np-${{Stage}}'),
+                'Type': 'network',
+                'Policy': sub(network_policy),
+            },
+        },
+        f'{collection_id}AP': {
+            'Type': 'AWS::OpenSearchServerless::AccessPolicy',
+            'Properties': {
+                'Name': sub(f'{lprefix}-{collection_name}-ap-${{Stage}}'),
+                'Type': 'data',
+                'Policy': sub(access_policy),
+            },
+        },
+        f'{collection_id}Collection': {
+            'Type': 'AWS::OpenSearchServerless::Collection',
+            'Properties': {
+                'Name': sub(collection),
+                'Type': 'SEARCH',
+                'Description': f'Serverless collection {collection_name}',
+            },
+            'DependsOn': [f'{collection_id}EP', f'{collection_id}NP'],
+        },
+    }
+
+
+def mqtt_resources(lprefix: str, mqtt: dict) -> dict:
+    function_arn = get_att(f'{logical_id(mqtt["authorizer"]["function"])}Function', 'Arn')
+
+    resources = {
+        f'{lprefix}MqttAuthorizer': {
+            'Type': 'AWS::IoT::Authorizer',
+            'Properties': {
+                'AuthorizerName': sub(f'{lprefix}-mqtt-authorizer-${{Stage}}'),
+                'AuthorizerFunctionArn': function_arn,
+                'Status': 'ACTIVE',
+                'SigningDisabled': True,
+            },
+        },
+        f'{lprefix}MqttAuthorizerPermission': {
+            'Type': 'AWS::Lambda::Permission',
+            'Properties': {
+                'FunctionName': function_arn,
+                'Action': 'lambda:InvokeFunction',
+                'Principal': 'iot.amazonaws.com',
+            },
+        },
+    }
+
+    if topics := mqtt.get('topics'):
+        topic_arns = []
+
+        for topic in topics:
+            topic_arns.append(sub(f'arn:aws:iot:${{AWS::Region}}:${{AWS::AccountId}}:topicfilter/{topic}'))
+            topic_arns.append(sub(f'arn:aws:iot:${{AWS::Region}}:${{AWS::AccountId}}:topic/{topic}'))
+
+        resources[f'{lprefix}MqttClientPolicy'] = {
+            'Type': 'AWS::IoT::Policy',
+            'Properties': {
+                'PolicyName': sub(f'{lprefix}-mqtt-client-${{Stage}}'),
+                'PolicyDocument': {
+                    'Version': POLICY_VERSION,
+                    'Statement': [
+                        {
+                            'Effect': 'Allow',
+                            'Action': ['iot:Connect'],
+                            'Resource': [sub('arn:aws:iot:${AWS::Region}:${AWS::AccountId}:client/*')],
+                        },
+                        {
+                            'Effect': 'Allow',
+                            'Action': ['iot:Subscribe', 'iot:Receive'],
+                            'Resource': topic_arns,
+                        },
+                    ],
+                },
+            },
+        }
+
+    return resources
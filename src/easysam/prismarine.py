@@ -1,10 +1,248 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+from importlib.metadata import version
+from itertools import repeat
+from multiprocessing import get_context
 from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Iterator
 import logging as lg
+import os
+import sys
+import time
 
 import prismarine.prisma_client as client
+import prismarine.prisma_common as prisma_common
+import prismarine.prisma_easysam as prisma_easysam
 
+from easysam.cache import DiskCache, digest, file_digest, write_stream
+
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+CLIENT_FILE = 'prismarine_client.py'
+
+# The model worker is restarted once its peak memory use exceeds this many bytes
+MODEL_WORKER_MAX_RSS = 1 << 30
+
+# Discovered clusters by (base directory, package), with the fingerprint of the package sources
+# and the application modules imported by the discovery
+clusters: dict[tuple[Path, str], tuple[tuple, object, dict[str, ModuleType]]] = {}
+
+# The application modules in `sys.modules`, those of the package whose cluster was used last
+active_modules: dict[str, ModuleType] = {}
+
+
+class ModelWorker:
+    """
+    A reusable worker process importing prismarine models, started on first use.
+
+    The models are imported and introspected in the interpreter of the worker, which only returns
+    descriptions of the clusters, so they never stay in the memory of EasySAM. The worker keeps
+    the clusters it discovered until it is released at the end of a run of `generate`, unless `keep`
+    is set, or until its peak memory use exceeds `max_rss` bytes, where the platform reports it.
+    """
+
+    def __init__(self, max_rss: int = MODEL_WORKER_MAX_RSS):
+        self.executor: ProcessPoolExecutor | None = None
+        self.pid: int | None = None
+        self.max_rss = max_rss
+        self.keep = False
+
+    def run(self, func: Callable, *args) -> Any:
+        # A forked process cannot use the worker of its parent, so it starts its own
+        if self.executor is None or self.pid != os.getpid():
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn'))
+            self.pid = os.getpid()
+
+        try:
+            result, rss = self.executor.submit(run_measured, func, *args).result()
+
+        except BrokenProcessPool:
+            self.stop()
+            raise
+
+        if rss is not None and rss > self.max_rss:
+            lg.info(f'Restarting the prismarine model worker, which used {rss >> 20} MiB')
+            self.stop()
+
+        return result
+
+    def release(self):
+        """Stop the worker at the end of a run, unless it is kept for the runs that follow."""
+        if not self.keep:
+            self.stop()
+
+    def stop(self):
+        if self.executor is not None and self.pid == os.getpid():
+            self.executor.shutdown()
+
+        self.executor = None
+
+
+def run_measured(func: Callable, *args) -> tuple[Any, int | None]:
+    """Call a function and return its result with the peak memory use of the process in bytes, if known."""
+    result = func(*args)
+
+    if resource is None:
+        return result, None
+
+    # Reported in kilobytes, except on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result, peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+model_worker = ModelWorker()
+
+
+def package_sources(package_dir: Path) -> list[Path]:
+    """Return the Python files of a package, except its generated client."""
+    return [path for path in sorted(package_dir.rglob('*.py')) if path.name != CLIENT_FILE]
+
+
+def package_fingerprint(base_dir: Path, package: str) -> tuple:
+    """Return the paths, modification times and sizes of the Python files of a package."""
+    return tuple(
+        (str(path), stat.st_mtime_ns, stat.st_size)
+        for path in package_sources(Path(base_dir, package))
+        if (stat := path.stat())
+    )
+
+
+def client_inputs(package_dir: Path, base: str, build_args: tuple) -> str:
+    """Hash the sources of a package and the settings its client is built with."""
+    parts = [version('prismarine'), base, list(build_args)]
+
+    for path in package_sources(package_dir):
+        parts.extend([path.relative_to(package_dir).as_posix(), path.read_bytes()])
+
+    return digest(*parts)
+
+
+@contextmanager
+def application_imports(roots: list[Path]) -> Iterator[dict[str, ModuleType]]:
+    """
+    Import with `roots` on `sys.path`, and collect the modules imported from them.
+
+    The path entries are removed afterwards, while the collected modules stay imported.
+    """
+
+    roots = [Path(root).resolve() for root in roots]
+    saved_path = list(sys.path)
+    saved_modules = set(sys.modules)
+    imported = {}
+    sys.path.extend(str(root) for root in roots if str(root) not in sys.path)
+
+    try:
+        yield imported
+
+    finally:
+        sys.path[:] = saved_path
+
+        for name in set(sys.modules) - saved_modules:
+            if is_application_module(sys.modules[name], roots):
+                imported[name] = sys.modules[name]
+
+
+def is_application_module(module: ModuleType, roots: list[Path]) -> bool:
+    locations = [module.__file__] if getattr(module, '__file__', None) else list(getattr(module, '__path__', []))
+    return any(Path(location).resolve().is_relative_to(root) for location in locations for root in roots)
+
+
+def activate_modules(modules: dict[str, ModuleType]):
+    """Replace the application modules of the previous package in `sys.modules` by those of a package."""
+    for name, module in active_modules.items():
+        if sys.modules.get(name) is module:
+            del sys.modules[name]
+
+    active_modules.clear()
+    active_modules.update(modules)
+    sys.modules.update(modules)
+
+
+def discover_cluster(base_dir: Path, package: str, pypath: list[Path]) -> tuple[Any, float | None]:
+    """
+    Return the prismarine cluster of a package, discovered once per process.
+
+    Discovery imports the models of the package, so the table loader and the client generator share it.
+    A cluster is discovered again when a Python file of its package changes. Only the application modules
+    of the package in use are imported, so packages of the same name under different bases never mix.
+
+    Returns:
+        The cluster and the discovery time in seconds, or None if the cluster was reused.
+    """
+
+    base_dir = Path(base_dir).resolve()
+    key = (base_dir, package)
+    fingerprint = package_fingerprint(base_dir, package)
+
+    if (cached := clusters.get(key)) and cached[0] == fingerprint:
+        activate_modules(cached[2])
+        return cached[1], None
+
+    start = time.perf_counter()
+    activate_modules({})
+
+    with application_imports([*pypath, base_dir]) as modules:
+        cluster = prisma_common.get_cluster(base_dir, package)
+
+    activate_modules(modules)
+    clusters[key] = fingerprint, cluster, modules
+    return cluster, time.perf_counter() - start
+
+
+def log_discovery(base_dir: Path, package: str, discovery: float | None):
+    if discovery is None:
+        lg.debug(f'Reusing prismarine cluster {package} of {base_dir}')
+    else:
+        lg.debug(f'Discovered prismarine cluster {package} of {base_dir} in {discovery:.3f}s')
+
+
+def describe_cluster(base_dir: Path, package: str, prefix: str, pypath: list[Path]) -> tuple[dict, float | None]:
+    """
+    Return the EasySAM tables of the cluster of a package, run in the model worker.
+
+    Returns:
+        The tables by name and the discovery time of the cluster, or None if it was reused.
+    """
+
+    cluster, discovery = discover_cluster(base_dir, package, pypath)
+    # TODO Amend prismarine to return errors
+    return prisma_easysam.build_dynamo_tables(prefix, cluster), discovery
+
+
+def dynamo_tables(base_dir: Path, package: str, prefix: str, pypath: list[Path]) -> dict:
+    """Return the EasySAM tables of the cluster of a package, introspected in the model worker."""
+    pypath = [Path(path).resolve() for path in pypath]
+    tables, discovery = model_worker.run(describe_cluster, base_dir, package, prefix, pypath)
+    log_discovery(base_dir, package, discovery)
+    return tables
+
+
+def generate(
+    directory: Path,
+    resources: dict,
+    errors: list[str],
+    workers: int = 1,
+    cache: DiskCache | None = None,
+    pypath: list[Path] | None = None,
+):
+    """
+    Build and write the prismarine clients of an application.
+
+    The clients are built in the model worker or, with more than one worker, in a fresh worker process
+    per package. They are written in the order of the tables, and no client is written after an error,
+    whatever the number of workers.
+
+    With a cache, a manifest of the package sources and client settings is kept for each written client,
+    and a client is not built again while its manifest and its file are unchanged.
+    """
 
-def generate(directory: Path, resources: dict, errors: list[str]):
     prisma = resources['prismarine']
 
     if not prisma:
@@ -27,32 +265,105 @@ def generate(directory: Path, resources: dict, errors: list[str]):
         extra_imports = []
         lg.info('No extra prismarine imports')
 
+    build_args = (resources['prefix'], access_module, extra_imports, modelling)
+    jobs = []
+    manifests = []
+
     for prisma_integration in prisma_tables:
         base = prisma_integration.get('base') or prisma_base
         package = prisma_integration.get('package')
-        base_dir = Path(directory, base)
+        manifest = None
 
-        if not base:
-            errors.append(f'No base found for {package}')
-            continue
+        if cache and base and package:
+            key = cache.key('prismarine-client', base, package)
+            manifest = key, client_inputs(Path(directory, base, package), base, build_args)
 
-        if not package:
-            errors.append(f'No package found for {base}')
+            if cache.get(key) == (manifest[1], file_digest(Path(directory, base, package, CLIENT_FILE))):
+                lg.info(f'Prismarine client for {package} is up to date')
+                continue
+
+        jobs.append((directory, base, package))
+        manifests.append(manifest)
+
+    # The models may import sibling packages of the application, as when loading the tables
+    pypath = [Path(path).resolve() for path in [directory, *(pypath or [])]]
+    workers = min(workers, len(jobs))
+
+    if workers > 1:
+        lg.info(f'Building {len(jobs)} prismarine clients in {workers} worker processes')
+
+        # A fresh interpreter per package, so the models of different packages never share imported modules
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context('spawn'), max_tasks_per_child=1
+        ) as executor:
+            results = list(executor.map(build_package_client, *zip(*jobs), repeat(pypath), *map(repeat, build_args)))
+
+    else:
+        results = [model_worker.run(build_package_client, *job, pypath, *build_args) for job in jobs]
+
+    # Clients are written once all are built, in the order of the tables, and not after the first error
+    for (_, base, package), manifest, (package_errors, content, elapsed, discovery) in zip(jobs, manifests, results):
+        errors.extend(package_errors)
+
+        if content is None:
             continue
 
-        cluster = client.get_cluster(base_dir, package)
+        log_discovery(Path(directory, base).resolve(), package, discovery)
+        lg.debug(f'Built prismarine client for {package} in {elapsed:.3f}s')
 
-        if not cluster.prefix.startswith(resources['prefix']):
-            errors.append(
-                f'When using with EasySAM, a Prismarine Cluster prefix ({cluster.prefix}) must start with the master prefix ({resources["prefix"]})'
-            )
+        if errors:
+            lg.warning(f'Not writing client for {package} due to errors')
             continue
 
-        content = client.build_client(
-            cluster, base_dir, base, access_module, extra_imports=extra_imports, model_library=modelling
-        )
+        client_path = Path(directory, base, package, CLIENT_FILE)
 
-        if not errors:
-            client.write_client(content, base_dir, package)
+        if write_stream(client_path, [content.encode('utf-8')], skip_unchanged=True):
+            lg.info(f'Prismarine client written: {client_path}')
         else:
-            lg.warning(f'Not writing client for {package} due to errors')
+            lg.info(f'Prismarine client unchanged: {client_path}')
+
+        if manifest:
+            cache.put(manifest[0], (manifest[1], file_digest(client_path)))
+
+
+def build_package_client(
+    directory: Path,
+    base: str | None,
+    package: str | None,
+    pypath: list[Path],
+    prefix: str,
+    access_module: str,
+    extra_imports: list,
+    modelling: str,
+) -> tuple[list[str], str | None, float, float | None]:
+    """
+    Build the prismarine client of a package, without writing it, in a worker process.
+
+    Returns:
+        The errors, the client content (None if it could not be built), the build time in seconds
+        and the discovery time of the cluster, or None if it was reused.
+    """
+
+    start = time.perf_counter()
+
+    if not base:
+        return [f'No base found for {package}'], None, 0.0, None
+
+    if not package:
+        return [f'No package found for {base}'], None, 0.0, None
+
+    base_dir = Path(directory, base)
+    cluster, discovery = discover_cluster(base_dir, package, pypath)
+
+    if not cluster.prefix.startswith(prefix):
+        message = (
+            f'When using with EasySAM, a Prismarine Cluster prefix ({cluster.prefix}) '
+            f'must start with the master prefix ({prefix})'
+        )
+        return [message], None, 0.0, discovery
+
+    content = client.build_client(
+        cluster, base_dir, base, access_module, extra_imports=extra_imports, model_library=modelling
+    )
+
+    return [], content, time.perf_counter() - start, discovery
@@ -0,0 +1,105 @@
+from typing import Iterator, NamedTuple
+
+
+# Sections whose entries are named resources that other resources refer to.
+SYMBOL_SECTIONS = ('functions', 'tables', 'queues', 'buckets', 'streams', 'search', 'authorizers')
+
+# Function fields referring to other resources, in the order they are validated.
+FUNCTION_REFERENCES = {
+    'buckets': 'buckets',
+    'tables': 'tables',
+    'polls': 'queues',
+    'send': 'queues',
+    'streams': 'streams',
+    'searches': 'search',
+}
+
+
+class Reference(NamedTuple):
+    """A reference from one resource to a named resource of another section."""
+
+    kind: str
+    name: str
+    field: str
+    target_kind: str
+    target: str
+
+    def __str__(self):
+        return f'{self.kind}.{self.name} -> {self.target_kind}.{self.target} ({self.field})'
+
+
+class ResourceIndex:
+    """
+    The symbol table of the named resources of an application and the references between them.
+
+    The index is built once from the loaded resources data, so cross-reference checks are
+    linear in the number of references.
+    """
+
+    def __init__(self, resources_data: dict):
+        self.symbols = {section: frozenset(resources_data.get(section) or {}) for section in SYMBOL_SECTIONS}
+        self.references: list[Reference] = []
+        self.by_kind: dict[str, list[Reference]] = {}
+        self.by_source: dict[tuple[str, str], list[Reference]] = {}
+        self.by_target: dict[tuple[str, str], list[Reference]] = {}
+
+        for reference in iter_references(resources_data):
+            self.references.append(reference)
+            self.by_kind.setdefault(reference.kind, []).append(reference)
+            self.by_source.setdefault((reference.kind, reference.name), []).append(reference)
+            self.by_target.setdefault((reference.target_kind, reference.target), []).append(reference)
+
+    def defines(self, kind: str, name: str) -> bool:
+        return name in self.symbols.get(kind, ())
+
+    def references_from(self, kind: str, name: str | None = None) -> list[Reference]:
+        """Return the references made by a resource, or by all resources of a section if `name` is None."""
+        if name is None:
+            return self.by_kind.get(kind, [])
+
+        return self.by_source.get((kind, name), [])
+
+    def references_to(self, kind: str, name: str) -> list[Reference]:
+        return self.by_target.get((kind, name), [])
+
+    def unresolved(self) -> list[Reference]:
+        return [ref for ref in self.references if not self.defines(ref.target_kind, ref.target)]
+
+
+def iter_references(resources_data: dict) -> Iterator[Reference]:
+    for function_name, function in (resources_data.get('functions') or {}).items():
+        for field, target_kind in FUNCTION_REFERENCES.items():
+            for target in function.get(field) or []:
+                if isinstance(target, dict):
+                    target = target.get('name')
+
+                yield Reference('functions', function_name, field, target_kind, target)
+
+    for table_name, table in (resources_data.get('tables') or {}).items():
+        if trigger := table.get('trigger'):
+            if isinstance(trigger, dict):
+                trigger = trigger.get('function')
+
+            yield Reference('tables', table_name, 'trigger', 'functions', trigger)
+
+    for stream_name, stream in (resources_data.get('streams') or {}).items():
+        for bucket in (stream.get('buckets') or {}).values():
+            if 'bucketname' in bucket:
+                yield Reference('streams', stream_name, 'bucketname', 'buckets', bucket['bucketname'])
+
+    for path, details in (resources_data.get('paths') or {}).items():
+        if 'function' in details:
+            yield Reference('paths', path, 'function', 'functions', details['function'])
+
+        if 'queue' in details:
+            yield Reference('paths', path, 'queue', 'queues', details['queue'])
+
+        if 'authorizer' in details:
+            yield Reference('paths', path, 'authorizer', 'authorizers', details['authorizer'])
+
+    for authorizer_name, authorizer in (resources_data.get('authorizers') or {}).items():
+        if 'function' in authorizer:
+            yield Reference('authorizers', authorizer_name, 'function', 'functions', authorizer['function'])
+
+    if mqtt_function := ((resources_data.get('mqtt') or {}).get('authorizer') or {}).get('function'):
+        yield Reference('mqtt', 'authorizer', 'function', 'functions', mqtt_function)
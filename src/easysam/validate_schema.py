@@ -1,50 +1,91 @@
+import copy
 import json
 import logging as lg
+import re
+from functools import cache
 from pathlib import Path
+from typing import Any, Callable
 
-from jsonschema import Draft7Validator
+from jsonschema import Draft7Validator, ValidationError
 
+from easysam.cache import DiskCache, digest
+from easysam.refs import ResourceIndex
 
-def validate(resources_dir: Path, resources_data: dict, errors: list[str]):
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+
+# The generated validator takes tens of milliseconds to compile, which only pays off
+# when this many import files are validated at once.
+FAST_VALIDATION_THRESHOLD = 500
+
+# How invalid function references are reported, by function field.
+FUNCTION_REFERENCE_ERRORS = {
+    'buckets': 'Bucket {target} must be a valid bucket',
+    'tables': 'Table {target} must be a valid table',
+    'polls': 'Queue {target} must be a valid queue',
+    'send': 'Send {target} must be a valid queue',
+    'streams': 'Stream {target} must be a valid stream',
+    'searches': 'Search {target} must be a valid search',
+}
+
+
+def validate(
+    resources_dir: Path,
+    resources_data: dict,
+    errors: list[str],
+    index: ResourceIndex | None = None,
+    cache: DiskCache | None = None,
+):
     """Validate resources data against the schema and perform custom validations.
 
     Args:
         resources_dir: The directory containing the resources.yaml file.
         resources_data: The pre-loaded resources data dictionary.
         errors: The list of errors.
+        index: The resource index used by cross-reference checks. Built from `resources_data` if not given.
+        cache: The cache of per-resource schema validation results.
     """
 
-    schema = load_schema('schemas.json')
-    validator = Draft7Validator(schema)
-    validation_errors = sorted(validator.iter_errors(resources_data), key=str)
+    index = index or ResourceIndex(resources_data)
 
-    for error in validation_errors:
-        lg.error(f'Validation error: {error}')
-        errors.append(f'Invalid resources data: {error.message} in {list(error.path)}')
+    for message in schema_errors(resources_data, cache):
+        lg.error(f'Validation error: {message}')
+        errors.append(message)
 
     # More specific validations
     validate_buckets(resources_data, errors)
-    validate_streams(resources_data, errors)
-    validate_tables(resources_data, errors)
-    validate_lambda(resources_data, errors)
-    validate_paths(resources_dir, resources_data, errors)
+    validate_streams(resources_data, index, errors)
+    validate_tables(index, errors)
+    validate_lambda(resources_data, index, errors)
+    validate_paths(resources_dir, resources_data, index, errors)
     validate_import(resources_dir, resources_data, errors)
     validate_prismarine(resources_dir, resources_data, errors)
-    validate_authorizers(resources_data, errors)
-    validate_mqtt(resources_data, errors)
+    validate_authorizers(resources_data, index, errors)
+    validate_mqtt(index, errors)
 
 
-def validate_local(entry_path: Path, entry_data: dict, errors: list[str]):
+def validate_local(entry_path: Path, entry_data: dict, errors: list[str], fast: bool = False):
     """Validate local easysam.yaml data against the local schema.
 
     Args:
         entry_path: The path to the local easysam.yaml file.
         entry_data: The loaded local easysam.yaml data.
         errors: The list of errors.
+        fast: Accept valid data with the code-generated validator, if `fastjsonschema` is installed.
     """
 
-    schema = load_schema('local_schemas.json')
-    validator = Draft7Validator(schema)
+    if fast and (fast_validator := fast_schema_validator('local_schemas.json')):
+        try:
+            fast_validator(entry_data)
+            return
+
+        except fastjsonschema.JsonSchemaException:
+            pass
+
+    validator = schema_validator('local_schemas.json')
     validation_errors = sorted(validator.iter_errors(entry_data), key=str)
 
     for error in validation_errors:
@@ -65,6 +106,122 @@ def load_schema(schema_file: str) -> dict:
     return json.loads(schema_path.read_text(encoding='utf-8'))
 
 
+@cache
+def schema_validator(schema_file: str) -> Draft7Validator:
+    """Return the validator of a schema file, loaded and compiled once per process."""
+    return Draft7Validator(load_schema(schema_file))
+
+
+def schema_errors(resources_data: dict, cache: DiskCache | None = None) -> list[str]:
+    """Validate resources data against the schema.
+
+    The resources of the sections that map names to resources (functions, tables, paths, ...) are
+    validated one at a time, and their results are cached by a hash of the resource, so only new
+    or changed resources are validated again. The rest of the document is always validated.
+
+    Returns:
+        The error messages, sorted.
+    """
+    messages = [schema_error_message(error) for error in document_validator().iter_errors(resources_data)]
+
+    for section, (pattern, validator) in resource_validators().items():
+        if isinstance(section_data := resources_data.get(section), dict):
+            messages.extend(section_schema_errors(section, section_data, pattern, validator, cache))
+
+    return sorted(messages)
+
+
+def section_schema_errors(
+    section: str,
+    section_data: dict,
+    pattern: str,
+    validator: Draft7Validator,
+    cache: DiskCache | None = None,
+) -> list[str]:
+    cache_key = cache.key('schema', schema_digest('schemas.json'), section) if cache else None
+    cached = (cache.get(cache_key) or {}) if cache_key else {}
+    results = {}
+    messages = []
+
+    for name, resource in section_data.items():
+        # Resources with invalid names are reported by the document validator
+        if not re.search(pattern, name):
+            continue
+
+        # Without a cache, the resources are validated without digesting them
+        resource_key = digest(name, resource) if cache_key else None
+
+        if (resource_messages := cached.get(resource_key)) is None:
+            lg.debug(f'Validating {section} {name} against the schema')
+            resource_errors = validator.iter_errors(resource)
+            resource_messages = [schema_error_message(error, [section, name]) for error in resource_errors]
+
+        if resource_key:
+            results[resource_key] = resource_messages
+
+        messages.extend(resource_messages)
+
+    if cache_key and results.keys() != cached.keys():
+        cache.put(cache_key, results)
+
+    return messages
+
+
+def schema_error_message(error: ValidationError, prefix: list[str] | None = None) -> str:
+    return f'Invalid resources data: {error.message} in {(prefix or []) + list(error.path)}'
+
+
+@cache
+def schema_digest(schema_file: str) -> str:
+    return digest(load_schema(schema_file))
+
+
+@cache
+def resource_validators() -> dict[str, tuple[str, Draft7Validator]]:
+    """Return the name pattern and the validator of the resources of each section that maps names to resources."""
+    schema = load_schema('schemas.json')
+    validators = {}
+
+    for section, section_schema in schema['properties'].items():
+        patterns = section_schema.get('patternProperties', {})
+
+        if len(patterns) != 1 or section_schema.get('additionalProperties') is not False:
+            continue
+
+        [(pattern, resource_schema)] = patterns.items()
+
+        if '$ref' in resource_schema:
+            resource_schema = dict(resource_schema, definitions=schema['definitions'])
+            validators[section] = (pattern, Draft7Validator(resource_schema))
+
+    return validators
+
+
+@cache
+def document_validator() -> Draft7Validator:
+    """Return a validator of the resources document that accepts any resource in the `resource_validators` sections."""
+    schema = copy.deepcopy(load_schema('schemas.json'))
+
+    for section, (pattern, _) in resource_validators().items():
+        schema['properties'][section]['patternProperties'][pattern] = {}
+
+    return Draft7Validator(schema)
+
+
+@cache
+def fast_schema_validator(schema_file: str) -> Callable[[Any], Any] | None:
+    """Return a code-generated validator of a schema file, if `fastjsonschema` is installed.
+
+    The generated validator stops at the first error, so it is only used to accept valid data
+    quickly; the errors of invalid data are always reported by the `jsonschema` validator.
+    Formats and defaults are disabled to match `Draft7Validator` and to leave the data unchanged.
+    """
+    if fastjsonschema is None:
+        return None
+
+    return fastjsonschema.compile(load_schema(schema_file), use_default=False, use_formats=False)
+
+
 def validate_buckets(resources_data: dict, errors: list[str]):
     """Validate bucket-specific rules."""
     for bucket, details in resources_data.get('buckets', {}).items():
@@ -72,17 +229,14 @@ def validate_buckets(resources_data: dict, errors: list[str]):
             errors.append(f"Bucket '{bucket}' cannot be public")
 
 
-def validate_tables(resources_data: dict, errors: list[str]):
+def validate_tables(index: ResourceIndex, errors: list[str]):
     """Validate table-specific rules."""
-    for table_name, table in resources_data.get('tables', {}).items():
-        if trigger_config := table.get('trigger'):
-            # trigger_config is always an object at this point (processed by load.py)
-            trigger_function = trigger_config.get('function')
-            if trigger_function not in resources_data.get('functions', {}):
-                errors.append(f'Table {table_name}: Trigger function {trigger_function} must be a valid function')
+    for ref in index.references_from('tables'):
+        if not index.defines(ref.target_kind, ref.target):
+            errors.append(f'Table {ref.name}: Trigger function {ref.target} must be a valid function')
 
 
-def validate_streams(resources_data: dict, errors: list[str]):
+def validate_streams(resources_data: dict, index: ResourceIndex, errors: list[str]):
     """Validate stream-specific rules."""
     for stream, details in resources_data.get('streams', {}).items():
         for bucket in details.get('buckets', {}).values():
@@ -97,7 +251,7 @@ def validate_streams(resources_data: dict, errors: list[str]):
             if 'bucketname' in bucket:
                 bucketname = bucket['bucketname']
 
-                if resources_data['buckets'].get(bucketname) is None:
+                if not index.defines('buckets', bucketname):
                     errors.append(f"Stream '{stream}': '{bucketname}' must be a valid bucket")
 
                 continue
@@ -107,67 +261,36 @@ def validate_streams(resources_data: dict, errors: list[str]):
                     errors.append(f"Stream '{stream}': 'extbucketarn' must be a valid ARN")
 
 
-def validate_lambda(resources_data: dict, errors: list[str]):
+def validate_lambda(resources_data: dict, index: ResourceIndex, errors: list[str]):
     """Validate lambda function-specific rules."""
     lg.debug('Validating lambda functions')
 
     for lambda_name, details in resources_data.get('functions', {}).items():
         lg.debug(f'Validating lambda {lambda_name}')
 
-        for bucket in details.get('buckets', []):
-            if bucket not in resources_data.get('buckets', {}):
-                errors.append(f'Lambda {lambda_name}: Bucket {bucket} must be a valid bucket')
-
-                continue
-
-        for table in details.get('tables', []):
-            if table not in resources_data.get('tables', {}):
-                errors.append(f'Lambda {lambda_name}: Table {table} must be a valid table')
-
-                continue
-
-        for poll in details.get('polls', []):
-            if poll['name'] not in resources_data.get('queues', {}):
-                errors.append(f'Lambda {lambda_name}: Queue {poll["name"]} must be a valid queue')
-
-                continue
-
-        for send in details.get('send', []):
-            if send not in resources_data.get('queues', {}):
-                errors.append(f'Lambda {lambda_name}: Send {send} must be a valid queue')
-
-                continue
-
-        for stream in details.get('streams', []):
-            if stream not in resources_data.get('streams', {}):
-                errors.append(f'Lambda {lambda_name}: Stream {stream} must be a valid stream')
-
-                continue
+        for ref in index.references_from('functions', lambda_name):
+            if not index.defines(ref.target_kind, ref.target):
+                message = FUNCTION_REFERENCE_ERRORS[ref.field].format(target=ref.target)
+                errors.append(f'Lambda {lambda_name}: {message}')
 
         if 'mqtt' in details.get('services', []):
             if not resources_data.get('mqtt'):
                 errors.append(f'Lambda {lambda_name}: Service mqtt requires mqtt to be defined in resources')
 
-        for collection in details.get('searches', []):
-            if collection not in resources_data.get('search', {}):
-                errors.append(f'Lambda {lambda_name}: Search {collection} must be a valid search')
-
-                continue
-
 
-def validate_paths(resources_dir: Path, resources_data: dict, errors: list[str]):
+def validate_paths(resources_dir: Path, resources_data: dict, index: ResourceIndex, errors: list[str]):
     """Validate path-specific rules."""
     for path, details in resources_data.get('paths', {}).items():
         match details.get('integration', 'lambda'):
             case 'lambda':
-                validate_lambda_path(resources_data, path, details, errors)
+                validate_lambda_path(index, path, details, errors)
             case 'dynamo':
                 validate_dynamo_path(resources_dir, path, details, errors)
             case 'sqs':
-                validate_sqs_path(resources_dir, resources_data, path, details, errors)
+                validate_sqs_path(resources_dir, index, path, details, errors)
 
 
-def validate_lambda_path(resources_data: dict, path: str, details: dict, errors: list[str]):
+def validate_lambda_path(index: ResourceIndex, path: str, details: dict, errors: list[str]):
     """Validate lambda path-specific rules."""
     authorizer = details.get('authorizer')
     open_path = details.get('open')
@@ -179,7 +302,7 @@ def validate_lambda_path(resources_data: dict, path: str, details: dict, errors:
         errors.append('Lambda path must have either authorizer or be open')
 
     if authorizer:
-        if authorizer not in resources_data.get('authorizers', {}):
+        if not index.defines('authorizers', authorizer):
             errors.append(f"Lambda path '{path}' authorizer must be a valid authorizer")
 
 
@@ -190,13 +313,13 @@ def validate_dynamo_path(resources_dir: Path, path: str, details: dict, errors:
 
 def validate_sqs_path(
     resources_dir: Path,
-    resources_data: dict,
+    index: ResourceIndex,
     path: str,
     details: dict,
     errors: list[str],
 ):
     """Validate SQS path-specific rules."""
-    if details['queue'] not in resources_data['queues']:
+    if not index.defines('queues', details['queue']):
         errors.append(f"SQS path '{path}' queue must be a valid queue")
 
     validate_request_response_templates(resources_dir, path, details, errors)
@@ -274,7 +397,7 @@ def validate_prismarine(resources_dir: Path, resources_data: dict, errors: list[
             errors.append(f"Prismarine table package '{table_base}' must have a valid base directory")
 
 
-def validate_authorizers(resources_data: dict, errors: list[str]):
+def validate_authorizers(resources_data: dict, index: ResourceIndex, errors: list[str]):
     """Validate authorizer-specific rules."""
     for authorizer, details in resources_data.get('authorizers', {}).items():
         present_types = ['token' in details, 'query' in details, 'headers' in details]
@@ -282,17 +405,12 @@ def validate_authorizers(resources_data: dict, errors: list[str]):
         if present_types.count(True) != 1:
             errors.append(f"Authorizer '{authorizer}' cannot have multiple types")
 
-        if details['function'] not in resources_data.get('functions', {}):
+        if not index.defines('functions', details['function']):
             errors.append(f"Authorizer '{authorizer}' function must be a valid function")
 
 
-def validate_mqtt(resources_data: dict, errors: list[str]):
+def validate_mqtt(index: ResourceIndex, errors: list[str]):
     """Validate MQTT-specific rules."""
-    mqtt = resources_data.get('mqtt')
-
-    if not mqtt:
-        return
-
-    auth_function = mqtt.get('authorizer', {}).get('function')
-    if auth_function and auth_function not in resources_data.get('functions', {}):
-        errors.append(f"MQTT authorizer function '{auth_function}' must be a valid function")
+    for ref in index.references_from('mqtt'):
+        if not index.defines(ref.target_kind, ref.target):
+            errors.append(f"MQTT authorizer function '{ref.target}' must be a valid function")
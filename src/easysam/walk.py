@@ -0,0 +1,182 @@
+import logging as lg
+import os
+import re
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+
+IGNORE_FILE = '.easysamignore'
+
+# Tool directories that never contain application sources
+SKIP_DIRS = frozenset(
+    [
+        '.aws-sam',
+        '.git',
+        '.venv',
+        '__pycache__',
+        'node_modules',
+    ]
+)
+
+LAMBDA_FILE = 'easysam.yaml'
+COMMON_DIR = 'common'
+
+
+def is_common_copy(directory: Path) -> bool:
+    """Whether a directory is the copy of `common` that `deploy` creates next to the `easysam.yaml` of a lambda."""
+    return directory.name == COMMON_DIR and Path(directory.parent, LAMBDA_FILE).is_file()
+
+
+class IgnoreRule:
+    """A single `.easysamignore` pattern, using the gitignore syntax."""
+
+    def __init__(self, pattern: str, base: str):
+        self.base = base
+        self.negate = pattern.startswith('!')
+        pattern = pattern[1:] if self.negate else pattern
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+        regex = translate_pattern(pattern)
+
+        if not anchored:
+            regex = f'(?:.*/)?{regex}'
+
+        self.regex = re.compile(regex, re.DOTALL)
+
+    def __repr__(self):
+        return f'IgnoreRule(base={self.base}, regex={self.regex.pattern}, negate={self.negate})'
+
+    def match(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+
+        if self.base:
+            if not rel_path.startswith(f'{self.base}/'):
+                return False
+
+            rel_path = rel_path[len(self.base) + 1 :]
+
+        return self.regex.fullmatch(rel_path) is not None
+
+
+def translate_pattern(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression matching a relative POSIX path."""
+    parts = []
+    i = 0
+
+    while i < len(pattern):
+        c = pattern[i]
+
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif c == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif c == '?':
+            parts.append('[^/]')
+            i += 1
+        elif c == '[' and (end := pattern.find(']', i + 2)) != -1:
+            body = pattern[i + 1 : end]
+
+            if body.startswith('!'):
+                body = '^' + body[1:]
+
+            parts.append(f'[{body}]')
+            i = end + 1
+        elif c == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+
+    return ''.join(parts)
+
+
+def read_ignore_file(ignore_path: Path, base: str) -> list[IgnoreRule]:
+    rules = []
+
+    for line in ignore_path.read_text(encoding='utf-8').splitlines():
+        line = line.rstrip()
+
+        if not line or line.startswith('#'):
+            continue
+
+        rules.append(IgnoreRule(line, base))
+
+    lg.debug(f'Loaded {len(rules)} ignore rules from {ignore_path}')
+    return rules
+
+
+def is_ignored(rules: list[IgnoreRule], rel_path: str, is_dir: bool) -> bool:
+    ignored = False
+
+    for rule in rules:
+        if rule.match(rel_path, is_dir):
+            ignored = not rule.negate
+
+    return ignored
+
+
+def find_files(
+    root: Path,
+    pattern: str,
+    max_depth: int | None = None,
+    skip_dirs: frozenset[str] = SKIP_DIRS,
+) -> list[Path]:
+    """
+    Find files matching a name pattern below a directory.
+
+    Directories in `skip_dirs`, the per-lambda copies of `common` and paths ignored by `.easysamignore` files
+    (gitignore syntax, scoped to the directory containing the file) are pruned without being descended into.
+
+    Args:
+        root: The directory to search.
+        pattern: A glob pattern matched against file names, e.g. `*.py`.
+        max_depth: The maximum number of directory levels to descend below `root`, or None for no limit.
+        skip_dirs: Directory names that are never descended into.
+
+    Returns:
+        The matching files, in a deterministic (sorted depth-first) order.
+    """
+
+    found = []
+    visited = set()
+
+    def visit(directory: Path, rel_dir: str, depth: int, rules: list[IgnoreRule]):
+        stat = directory.stat()
+
+        if (stat.st_dev, stat.st_ino) in visited:
+            return
+
+        visited.add((stat.st_dev, stat.st_ino))
+        ignore_path = Path(directory, IGNORE_FILE)
+
+        if ignore_path.is_file():
+            rules = rules + read_ignore_file(ignore_path, rel_dir)
+
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda x: x.name)
+
+        for entry in entries:
+            rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+
+            if entry.is_dir():
+                if entry.name in skip_dirs or is_common_copy(Path(entry.path)) or is_ignored(rules, rel_path, True):
+                    lg.debug(f'Skipping directory {entry.path}')
+                    continue
+
+                if max_depth is None or depth < max_depth:
+                    visit(Path(entry.path), rel_path, depth + 1, rules)
+
+            elif fnmatchcase(entry.name, pattern) and not is_ignored(rules, rel_path, False):
+                found.append(Path(entry.path))
+
+    visit(Path(root), '', 0, [])
+    return found
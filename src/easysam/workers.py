@@ -0,0 +1,21 @@
+import logging as lg
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+
+def worker_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Create a pool of worker processes started from a fresh interpreter.
+
+    Forking could copy the locks held by the threads of this process, such as those of the prismarine
+    model worker, so the workers are spawned and log at the level of this process.
+    """
+
+    level = lg.getLogger().getEffectiveLevel()
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context('spawn'), initializer=init_worker, initargs=(level,)
+    )
+
+
+def init_worker(level: int):
+    lg.basicConfig(level=level)
@@ -0,0 +1,43 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+import easysam.cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    # Keep the compiled templates and the application caches of the examples out of the user's and the repo's
+    # directories. Worker processes do not see the patched cache root, so they still use the application's own.
+    cache_dir = tmp_path / 'easysam-cache'
+    monkeypatch.setenv('EASYSAM_CACHE_DIR', str(cache_dir / 'user'))
+    monkeypatch.setattr(
+        easysam.cache,
+        'cache_root',
+        lambda resources_dir: Path(cache_dir, 'apps', *Path(resources_dir).resolve().parts[1:]),
+    )
+
+
+@pytest.fixture
+def ruff_on_path(monkeypatch):
+    # The prismarine clients are formatted with ruff, installed next to the interpreter
+    monkeypatch.setenv('PATH', f'{Path(sys.executable).parent}{os.pathsep}{os.environ["PATH"]}')
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Return a function writing the files of an application, by path relative to its directory."""
+
+    def make(files: dict[str, str], app_dir: Path | None = None) -> Path:
+        app_dir = app_dir or tmp_path
+
+        for name, content in files.items():
+            path = Path(app_dir, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding='utf-8')
+
+        return app_dir
+
+    return make
@@ -0,0 +1,29 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+import easysam.cache
+from easysam.cache import DiskCache, package_digest
+
+
+@pytest.fixture
+def package_copy(tmp_path, monkeypatch):
+    package_dir = tmp_path / 'easysam'
+    source_dir = Path(easysam.cache.__file__).parent
+    shutil.copytree(source_dir, package_dir, ignore=shutil.ignore_patterns('__pycache__'))
+    monkeypatch.setattr(easysam.cache, '__file__', str(package_dir / 'cache.py'))
+    package_digest.cache_clear()
+    yield package_dir
+    package_digest.cache_clear()
+
+
+def test_cache_keys_follow_package_sources(tmp_path, package_copy):
+    key = DiskCache(tmp_path / 'cache').key('part')
+    assert DiskCache(tmp_path / 'cache').key('part') == key
+
+    template = package_copy / 'template.j2'
+    template.write_text(template.read_text(encoding='utf-8') + '\n', encoding='utf-8')
+    package_digest.cache_clear()
+
+    assert DiskCache(tmp_path / 'cache').key('part') != key
@@ -0,0 +1,39 @@
+import os
+
+from easysam.cache import DiskCache
+from easysam.commondep import ImportCache, commondep
+
+
+FILES = {
+    'common/utils.py': 'import json\nfrom common.models import Item\n',
+    'common/models/__init__.py': 'from common.models.item import Item\n',
+    'common/models/item.py': 'from typing import TypedDict\n',
+    'common/unused.py': '',
+    'backend/func/index.py': 'import common.utils\n',
+}
+
+
+def resolve(app_dir, cache):
+    import_cache = ImportCache(cache)
+    deps = commondep(app_dir / 'common', app_dir / 'backend' / 'func', import_cache)
+    import_cache.save()
+    return deps, import_cache.parsed
+
+
+def test_import_cache_only_parses_changed_files(tmp_path, make_app):
+    app_dir = make_app(FILES, tmp_path / 'app')
+    cache = DiskCache(tmp_path / 'cache')
+
+    assert resolve(app_dir, cache) == (['models', 'utils'], 4)
+    assert resolve(app_dir, cache) == (['models', 'utils'], 0)
+
+    # A touched file is hashed, but not parsed again
+    index = app_dir / 'backend' / 'func' / 'index.py'
+    stat = index.stat()
+    os.utime(index, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert resolve(app_dir, cache) == (['models', 'utils'], 0)
+
+    index.write_text('from common.models import Item\n', encoding='utf-8')
+    assert resolve(app_dir, cache) == (['models'], 1)
+
+    assert resolve(app_dir, None) == (['models'], 3)
@@ -1,6 +1,8 @@
+import pytest
 import yaml
 from pathlib import Path
 from easysam.generate import generate
+from easysam.load import Conditional, Loader, compile_condition, condition, load_yaml
 
 
 def get_resources(example_path, deploy_ctx):
@@ -60,3 +62,44 @@ def test_conditionals_other():
     assert 'myappmybucketReadPolicy' in resources
     policy = resources['myappmybucketReadPolicy']
     assert policy['Properties']['ManagedPolicyName'] == {'Fn::Sub': 'CommonPolicy-${Stage}'}
+
+
+def test_conditional_tag_not_registered_globally():
+    assert '!Conditional' not in yaml.SafeLoader.yaml_constructors
+    assert '!Conditional' in Loader.yaml_constructors
+
+    data = load_yaml('? !Conditional {key: a, environment: prod}\n: 1\n')
+    (key,) = data.keys()
+    assert isinstance(key, Conditional)
+    assert key.key == 'a'
+    assert key.environment == 'prod'
+
+
+def test_compiled_conditions():
+    # Other tests evaluate the same shared conditions
+    compile_condition.cache_clear()
+    prod = condition('environment', 'prod')
+    assert condition('environment', 'prod') is prod
+    assert prod.check({'environment': 'prod'}, [])
+    assert not prod.check({'environment': 'dev'}, [])
+    assert prod.results == {'prod': True, 'dev': False}
+
+    not_prod = condition('environment', '~prod')
+    assert not not_prod.check({'environment': 'prod'}, [])
+    assert not_prod.check({'environment': 'dev'}, [])
+
+    alternatives = condition('target_region', ['eu-west-1', ['eu-west-2']])
+    assert alternatives is condition('target_region', ['eu-west-1', 'eu-west-2'])
+    assert alternatives.check({'target_region': 'eu-west-2'}, [])
+    assert not alternatives.check({'target_region': 'us-east-1'}, [])
+
+    assert condition('environment', ['dev', 'any']).check({}, [])
+
+
+def test_yaml_syntax_errors_quote_the_source():
+    with pytest.raises(yaml.MarkedYAMLError) as e:
+        load_yaml('prefix: test\nimport: backend: frontend\n')
+
+    assert 'mapping values are not allowed here' in str(e.value)
+    assert 'import: backend: frontend' in str(e.value)
+    assert '^' in str(e.value)
@@ -48,3 +48,26 @@ lambda:
     assert res['functions']['myfunc']['uri'] == 'src/my_test_value2'
     assert 'paths' in res
     assert list(res['paths'].keys())[0] == '/mytestvar'
+
+
+def test_envvars_expansion_in_conditionals(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROD_LEVEL', 'warning')
+
+    res_file = tmp_path / 'resources.yaml'
+    res_file.write_text("""
+prefix: test
+envvars:
+  ? !Conditional
+    key: LOG_LEVEL
+    environment: prod
+  : $PROD_LEVEL
+  ? !Conditional
+    key: LOG_LEVEL
+    environment: ~prod
+  : debug
+""")
+
+    errors = []
+    res = resources(tmp_path, [], {'environment': 'prod', 'target_region': 'us-east-1'}, errors)
+    assert not errors
+    assert res['envvars'] == {'LOG_LEVEL': 'warning'}
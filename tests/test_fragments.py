@@ -0,0 +1,89 @@
+import logging
+
+from easysam.generate import generate
+
+
+RESOURCES_YAML = """
+prefix: FragApp
+import: [backend]
+buckets:
+  mybucket:
+    public: true
+tables:
+  Items:
+    attributes:
+      - name: ID
+        hash: true
+    trigger: first
+"""
+
+EASYSAM_YAML = """
+lambda:
+  name: {name}
+  resources:
+    tables: [Items]
+    buckets: [mybucket]
+  integration:
+    path: /{name}
+    open: true
+"""
+
+
+APP = {
+    'resources.yaml': RESOURCES_YAML,
+    'backend/first/easysam.yaml': EASYSAM_YAML.format(name='first'),
+    'backend/second/easysam.yaml': EASYSAM_YAML.format(name='second'),
+}
+
+
+def render(app_dir, output_dir, cliparams):
+    _, errors = generate(cliparams, app_dir, [], {'environment': 'dev', 'target_region': 'us-east-1'}, output_dir)
+    assert not errors
+    return (output_dir / 'template.yml').read_bytes(), (output_dir / 'build' / 'swagger.yaml').read_bytes()
+
+
+def test_fragments_match_full_render(tmp_path, caplog, make_app):
+    caplog.set_level(logging.DEBUG)
+    app_dir = make_app(APP, tmp_path / 'app')
+    template = tmp_path / 'cold' / 'template.yml'
+    swagger = tmp_path / 'cold' / 'build' / 'swagger.yaml'
+
+    cold = render(app_dir, tmp_path / 'cold', {})
+    assert render(app_dir, tmp_path / 'full', {'no_cache': True}) == cold
+    assert f'Reused 0 of 4 cached fragments of {template}' in caplog.messages
+    assert f'Reused 0 of 2 cached fragments of {swagger}' in caplog.messages
+
+    caplog.clear()
+    assert render(app_dir, tmp_path / 'cold', {}) == cold
+    assert f'Reused 4 of 4 cached fragments of {template}' in caplog.messages
+    assert f'Reused 2 of 2 cached fragments of {swagger}' in caplog.messages
+
+    second_yaml = app_dir / 'backend' / 'second' / 'easysam.yaml'
+    second_yaml.write_text(
+        EASYSAM_YAML.format(name='second').replace('  integration:', '  memory: 512\n  integration:'), encoding='utf-8'
+    )
+
+    caplog.clear()
+    warm = render(app_dir, tmp_path / 'cold', {})
+    assert f'Reused 3 of 4 cached fragments of {template}' in caplog.messages
+    assert f'Reused 2 of 2 cached fragments of {swagger}' in caplog.messages
+    assert warm != cold
+    assert b'MemorySize: 512' in warm[0]
+    assert render(app_dir, tmp_path / 'full', {'no_cache': True}) == warm
+
+
+def test_fragments_follow_key_order(tmp_path, make_app):
+    app_dir = make_app(APP, tmp_path / 'app')
+    resources_yaml = app_dir / 'resources.yaml'
+
+    envvars = {'ALPHA': 'a', 'BETA': 'b'}
+
+    for first, second in [('ALPHA', 'BETA'), ('BETA', 'ALPHA')]:
+        lines = f'      {first}: {envvars[first]}\n      {second}: {envvars[second]}\n'
+        resources_yaml.write_text(
+            RESOURCES_YAML + f'functions:\n  third:\n    uri: backend/third\n    envvars:\n{lines}', encoding='utf-8'
+        )
+
+        cached, _ = render(app_dir, tmp_path / 'cached', {})
+        assert render(app_dir, tmp_path / 'full', {'no_cache': True})[0] == cached
+        assert cached.index(first.encode()) < cached.index(second.encode())
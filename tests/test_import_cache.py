@@ -0,0 +1,80 @@
+import easysam.cache
+from easysam.load import resources
+
+
+RESOURCES_YAML = 'prefix: test\nimport: [backend]'
+
+EASYSAM_YAML = """
+lambda:
+  name: myfunc
+  integration:
+    path: /test
+    open: true
+  resources:
+    uri: "src/$FUNC_SRC"
+"""
+
+
+APP = {'resources.yaml': RESOURCES_YAML, 'backend/func/easysam.yaml': EASYSAM_YAML}
+
+
+def cache_entries(tmp_path):
+    return sorted(easysam.cache.cache_root(tmp_path).glob('imports/**/*.pickle'))
+
+
+def test_import_cache_reused(tmp_path, monkeypatch, make_app):
+    monkeypatch.setenv('FUNC_SRC', 'v1')
+    make_app(APP)
+    deploy_ctx = {'environment': 'dev', 'target_region': 'us-east-1'}
+
+    errors = []
+    first = resources(tmp_path, [], deploy_ctx, errors)
+    assert not errors
+    assert len(cache_entries(tmp_path)) == 1
+
+    errors = []
+    second = resources(tmp_path, [], deploy_ctx, errors)
+    assert not errors
+    assert len(cache_entries(tmp_path)) == 1
+    assert second == first
+
+
+def test_import_cache_invalidation(tmp_path, monkeypatch, make_app):
+    monkeypatch.setenv('FUNC_SRC', 'v1')
+    easysam_yaml = make_app(APP) / 'backend' / 'func' / 'easysam.yaml'
+    deploy_ctx = {'environment': 'dev', 'target_region': 'us-east-1'}
+
+    res = resources(tmp_path, [], deploy_ctx, [])
+    assert res['functions']['myfunc']['uri'] == 'src/v1'
+
+    monkeypatch.setenv('FUNC_SRC', 'v2')
+    res = resources(tmp_path, [], deploy_ctx, [])
+    assert res['functions']['myfunc']['uri'] == 'src/v2'
+
+    easysam_yaml.write_text(EASYSAM_YAML.replace('/test', '/other'), encoding='utf-8')
+    res = resources(tmp_path, [], deploy_ctx, [])
+    assert '/other' in res['paths']
+
+    res = resources(tmp_path, [], {'environment': 'prod', 'target_region': 'us-east-1'}, [])
+    assert len(cache_entries(tmp_path)) == 4
+
+
+def test_import_cache_disabled(tmp_path, monkeypatch, make_app):
+    monkeypatch.setenv('FUNC_SRC', 'v1')
+    make_app(APP)
+
+    errors = []
+    resources(tmp_path, [], {}, errors, {'no_cache': True})
+    assert not errors
+    assert not cache_entries(tmp_path)
+
+
+def test_import_cache_skips_invalid_files(tmp_path, make_app):
+    make_app(dict(APP, **{'backend/func/easysam.yaml': 'lambda:\n  name: myfunc\n  memory: 64\n'}))
+
+    for _ in range(2):
+        errors = []
+        resources(tmp_path, [], {}, errors)
+        assert any('Invalid local resources data' in err for err in errors)
+
+    assert not cache_entries(tmp_path)
@@ -0,0 +1,49 @@
+from easysam.load import ImportGraph, resources
+
+
+TABLE_YAML = 'tables:\n  {name}:\n    attributes:\n      - name: id\n        hash: true\n'
+
+
+def diamond_app(shared_import):
+    """Two lambdas importing shared/c, which imports shared/d."""
+    files = {
+        f'backend/{name}/easysam.yaml': f'lambda:\n  name: func{name}\n  integration:\n    path: /{name}\n'
+        '    open: true\nimport: [../../shared/c/easysam.yaml]\n'
+        for name in ['a', 'b']
+    }
+
+    return {
+        'resources.yaml': 'prefix: test\nimport: [backend]',
+        **files,
+        'shared/c/easysam.yaml': TABLE_YAML.format(name='tablec') + 'import: [../d/easysam.yaml]\n',
+        'shared/d/easysam.yaml': TABLE_YAML.format(name='tabled') + shared_import,
+    }
+
+
+def test_diamond_import_merged_once(tmp_path, make_app):
+    make_app(diamond_app(''))
+    graph = ImportGraph(tmp_path)
+
+    errors = []
+    res = resources(tmp_path, [], {}, errors, {'no_cache': True}, graph)
+
+    assert not errors
+    assert sorted(res['tables']) == ['tablec', 'tabled']
+    assert len(graph.timings) == 4
+    assert [graph.relative(root) for root in graph.roots] == ['backend/a/easysam.yaml', 'backend/b/easysam.yaml']
+
+    shared = (tmp_path / 'shared' / 'c' / 'easysam.yaml').resolve()
+    assert graph.imports[(tmp_path / 'backend' / 'b' / 'easysam.yaml').resolve()] == [shared]
+
+
+def test_import_cycle_reported_once(tmp_path, make_app):
+    make_app(diamond_app('import: [../c/easysam.yaml]\n'))
+
+    for workers in [1, 2]:
+        graph = ImportGraph(tmp_path, workers=workers)
+        errors = []
+        res = resources(tmp_path, [], {}, errors, {'no_cache': True}, graph)
+
+        assert errors == ['Import cycle: shared/c/easysam.yaml -> shared/d/easysam.yaml -> shared/c/easysam.yaml']
+        assert sorted(res['tables']) == ['tablec', 'tabled']
+        assert len(graph.cycles) == 1
@@ -0,0 +1,52 @@
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+
+from easysam.generate import generate, generate_matrix, matrix_output_dir
+from easysam.prismarine import model_worker
+
+
+CONTEXTS = {
+    'prod': {'environment': 'prod', 'target_region': 'us-east-1'},
+    'euwest2': {'environment': 'dev', 'target_region': 'eu-west-2'},
+    'other': {'environment': 'dev', 'target_region': 'us-east-1'},
+}
+
+
+def test_matrix_matches_single_runs(tmp_path):
+    example_path = tmp_path / 'conditionals'
+    shutil.copytree(Path('example/conditionals'), example_path)
+    cliparams = {'no_cache': True}
+
+    expected = {}
+
+    for name, deploy_ctx in CONTEXTS.items():
+        _, errors = generate(cliparams, example_path, [], deploy_ctx)
+        assert not errors
+        expected[name] = (example_path / 'template.yml').read_bytes()
+
+    for workers in [1, 2]:
+        results = generate_matrix(dict(cliparams, workers=workers), example_path, [], CONTEXTS)
+        assert list(results) == list(CONTEXTS)
+
+        for name, (_, errors) in results.items():
+            assert not errors
+            output_dir = matrix_output_dir(example_path, name)
+            assert (output_dir / 'template.yml').read_bytes() == expected[name]
+            (output_dir / 'template.yml').unlink()
+
+
+@pytest.mark.usefixtures('ruff_on_path')
+def test_matrix_discovers_prismarine_models_once(tmp_path, caplog):
+    caplog.set_level(logging.DEBUG)
+    example_path = tmp_path / 'prismarine'
+    shutil.copytree('example/prismarine', example_path, ignore=shutil.ignore_patterns('build', 'prismarine_client.py'))
+
+    results = generate_matrix({}, example_path, [], CONTEXTS)
+    assert not [errors for _, errors in results.values() if errors]
+
+    discovered = [m for m in caplog.messages if m.startswith('Discovered prismarine cluster myobject')]
+    assert len(discovered) == 1
+    assert model_worker.executor is None
@@ -0,0 +1,242 @@
+import shutil
+from datetime import date
+from pathlib import Path
+
+import pytest
+import yaml
+
+from easysam.cache import digest
+from easysam.generate import render_sam_template
+from easysam.native import MIRRORED_TEMPLATES, MIRRORED_TEMPLATES_DIGEST
+from easysam.load import resources as load_resources
+
+
+EXAMPLES = sorted(path for path in Path('example').iterdir() if Path(path, 'resources.yaml').exists())
+
+DEPLOY_CONTEXTS = [
+    {'environment': 'dev', 'target_region': 'us-east-1'},
+    {'environment': 'prod', 'target_region': 'eu-west-2'},
+    {'environment': 'devaoss', 'target_region': 'us-east-1'},
+]
+
+
+class TemplateLoader(yaml.SafeLoader):
+    """Load the short form intrinsic functions of a template into their long form."""
+
+
+TemplateLoader.add_constructor('!Ref', lambda loader, node: {'Ref': loader.construct_scalar(node)})
+TemplateLoader.add_constructor('!Sub', lambda loader, node: {'Fn::Sub': loader.construct_scalar(node)})
+TemplateLoader.add_constructor(
+    '!GetAtt', lambda loader, node: {'Fn::GetAtt': loader.construct_scalar(node).split('.', 1)}
+)
+
+
+def normalize(value):
+    """
+    Read the values CloudFormation reads as strings as such, so `2012-10-17` and `"2012-10-17"` are equal.
+
+    Those are dates, and the environment variables of the functions, which the Jinja templates write unquoted.
+    """
+    if isinstance(value, dict):
+        return {
+            key: {name: scalar_text(item) for name, item in item.items()}
+            if key == 'Variables' and isinstance(item, dict)
+            else normalize(item)
+            for key, item in value.items()
+        }
+
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def scalar_text(value):
+    if isinstance(value, (dict, list)):
+        return normalize(value)
+
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def load_template(path: Path):
+    return normalize(yaml.load(path.read_text(encoding='utf-8'), Loader=TemplateLoader))
+
+
+def test_native_engine_mirrors_current_templates():
+    template_dir = Path('src/easysam')
+    sources = [Path(template_dir, name).read_bytes().replace(b'\r\n', b'\n') for name in MIRRORED_TEMPLATES]
+    assert digest(*sources) == MIRRORED_TEMPLATES_DIGEST, 'Update easysam.native to the changed templates'
+
+
+@pytest.mark.parametrize('example', EXAMPLES, ids=[example.name for example in EXAMPLES])
+def test_native_engine_matches_jinja(example, tmp_path):
+    app_dir = tmp_path / example.name
+    shutil.copytree(example, app_dir, ignore=shutil.ignore_patterns('build', 'template.yml', '.aws-sam'))
+    rendered = 0
+
+    for i, deploy_ctx in enumerate(DEPLOY_CONTEXTS):
+        errors = []
+        resources_data = load_resources(app_dir, [], deploy_ctx, errors, {'no_cache': True})
+
+        if errors:
+            continue
+
+        jinja_dir, native_dir = tmp_path / f'jinja{i}', tmp_path / f'native{i}'
+
+        try:
+            render_sam_template(app_dir, resources_data, jinja_dir, {'no_cache': True})
+
+        except Exception:
+            with pytest.raises(Exception):
+                render_sam_template(app_dir, resources_data, native_dir, {'no_cache': True, 'engine': 'native'})
+
+            continue
+
+        render_sam_template(app_dir, resources_data, native_dir, {'no_cache': True, 'engine': 'native'})
+        assert load_template(native_dir / 'template.yml') == load_template(jinja_dir / 'template.yml')
+        rendered += 1
+
+    if example.name != 'appwitherrors':
+        assert rendered
+
+
+KITCHEN_SINK_YAML = """
+prefix: KitchenSink
+python: "3.12"
+envvars:
+  LOG_LEVEL: debug
+  RETRIES: "3"
+buckets:
+  assets:
+    public: false
+  public-content:
+    public: true
+    extaccesspolicy: PublicContentReadPolicy
+queues:
+  jobs:
+  notifications:
+streams:
+  simple:
+    bucketname: assets
+    bucketprefix: simple/
+    intervalinseconds: 60
+  complex:
+    buckets:
+      external:
+        extbucketarn: arn:aws:s3:::my-external-bucket
+search:
+  searchable:
+tables:
+  MyItem:
+    attributes:
+      - name: ItemID
+        hash: true
+      - name: SortKey
+        range: true
+    indices:
+      - name: BySortKey
+        attributes:
+          - name: SortKey
+            hash: true
+          - name: ItemID
+            range: true
+    ttl: ExpireAt
+    trigger:
+      function: worker-func
+      viewtype: keys-only
+      batchsize: 10
+      batchwindow: 5
+      startingposition: trim-horizon
+functions:
+  worker-func:
+    uri: backend/worker
+    timeout: 60
+    memory: 1024
+    tables: [MyItem]
+    buckets: [public-content]
+    streams: [simple]
+    polls:
+      - name: jobs
+        batchsize: 10
+        batchwindow: 5
+      - name: notifications
+    send: [notifications]
+    services: [comprehend, bedrock, mqtt, budget]
+    searches: [searchable]
+    schedule: rate(5 minutes)
+    envvars:
+      MODE: worker
+    layers:
+      ffmpeg: '{{resolve:ssm:/ffmpeg-latest-arn}}'
+    functionurl:
+      auth_type: AWS_IAM
+      invoke_mode: RESPONSE_STREAM
+      cors:
+        allow_origins: ["*"]
+        allow_methods: [GET, POST]
+        allow_headers: [Content-Type]
+        expose_headers: [X-Request-Id]
+        allow_credentials: true
+        max_age: 3600
+  api-func:
+    uri: backend/api
+    functionurl: true
+    searches: [searchable]
+  token-auth:
+    uri: backend/auth
+  headers-auth:
+    uri: backend/headers
+  query-auth:
+    uri: backend/query
+  mqtt-auth:
+    uri: backend/mqtt
+paths:
+  /items:
+    function: api-func
+    authorizer: token-auth
+  /open/:
+    function: api-func
+    open: true
+    greedy: false
+  /jobs:
+    integration: sqs
+    role: GatewaySQSRole
+    queue: jobs
+    requestTemplate: Action=SendMessage
+    responseTemplate: ok
+authorizers:
+  token-auth:
+    function: token-auth
+    token: Authorization
+  headers-auth:
+    function: headers-auth
+    headers: [X-Api-Key, X-Tenant]
+    ttl: 60
+  query-auth:
+    function: query-auth
+    query: token
+mqtt:
+  authorizer:
+    function: mqtt-auth
+  topics:
+    - channels/*
+    - alerts
+"""
+
+
+def test_native_engine_matches_jinja_for_all_sections(tmp_path):
+    app_dir = tmp_path / 'app'
+    app_dir.mkdir()
+    Path(app_dir, 'resources.yaml').write_text(KITCHEN_SINK_YAML, encoding='utf-8')
+    Path(app_dir, 'thirdparty').mkdir()
+
+    errors = []
+    resources_data = load_resources(app_dir, [], {'environment': 'dev'}, errors, {'no_cache': True})
+    assert not errors
+
+    render_sam_template(app_dir, resources_data, tmp_path / 'jinja', {'no_cache': True})
+    render_sam_template(app_dir, resources_data, tmp_path / 'native', {'no_cache': True, 'engine': 'native'})
+
+    native = load_template(tmp_path / 'native' / 'template.yml')
+    assert native == load_template(tmp_path / 'jinja' / 'template.yml')
+    assert 'KitchenSinkMyItem' in native['Resources'] and 'kitchensinkMqttClientPolicy' in native['Resources']
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+from easysam.generate import generate
+
+
+RESOURCES_YAML = """
+prefix: Stages
+import: [backend]
+plugins:
+  first:
+    template: first.j2
+    aux:
+      funname: firstfun
+  broken:
+    template: broken.j2
+  missing:
+    template: missing.j2
+  second:
+    template: second.j2
+    aux:
+      funname: secondfun
+  invalid:
+    template: invalid.j2
+"""
+
+EASYSAM_YAML = """
+lambda:
+  name: myfunc
+  integration:
+    path: /items
+    open: true
+"""
+
+TEMPLATES = {
+    'first.j2': 'Resources:\n  {{ funname }}Function:\n    Type: AWS::Serverless::Function\n',
+    'second.j2': 'Resources:\n  {{ funname }}Function:\n    Prefix: {{ prefix }}\n',
+    'broken.j2': 'Resources: {{ funname | nosuchfilter }}\n',
+    'invalid.j2': 'Resources: {% if %}\n',
+}
+
+
+def outputs(output_dir: Path) -> dict[str, bytes]:
+    return {str(path.relative_to(output_dir)): path.read_bytes() for path in output_dir.rglob('*.y*ml')}
+
+
+def test_parallel_stages_match_serial(tmp_path, make_app):
+    app_dir = make_app(
+        {'resources.yaml': RESOURCES_YAML, 'backend/myfunc/easysam.yaml': EASYSAM_YAML, **TEMPLATES}, tmp_path / 'app'
+    )
+    deploy_ctx = {'environment': 'dev', 'target_region': 'us-east-1'}
+
+    serial_data, serial_errors = generate({'no_cache': True}, app_dir, [], deploy_ctx, tmp_path / 'serial')
+    parallel_data, parallel_errors = generate(
+        {'no_cache': True, 'workers': 4}, app_dir, [], deploy_ctx, tmp_path / 'parallel'
+    )
+
+    assert len(serial_errors) == 3
+    assert serial_errors[0].startswith('Plugin ') and 'missing.j2' in serial_errors[0]
+    assert serial_errors[1].startswith('Error generating plugin broken: ')
+    assert "No filter named 'nosuchfilter'" in serial_errors[1]
+    assert serial_errors[2].startswith('Error generating plugin invalid: ')
+    assert parallel_errors == serial_errors
+    assert parallel_data == serial_data
+
+    serial_outputs = outputs(tmp_path / 'serial')
+    assert sorted(serial_outputs) == ['build/swagger.yaml', 'first.yaml', 'second.yaml', 'template.yml']
+    assert b'secondfunFunction' in serial_outputs['second.yaml']
+    assert outputs(tmp_path / 'parallel') == serial_outputs
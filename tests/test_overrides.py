@@ -0,0 +1,20 @@
+from easysam.load import resources
+
+
+def test_overrides_on_plain_resources(tmp_path):
+    (tmp_path / 'resources.yaml').write_text(
+        'prefix: test\nbuckets:\n  mybucket:\n    public: false\n', encoding='utf-8'
+    )
+    deploy_ctx = {
+        'environment': 'dev',
+        'target_region': 'us-east-1',
+        'overrides': {'buckets/mybucket/extaccesspolicy': 'MyPolicy'},
+    }
+
+    errors = []
+    res = resources(tmp_path, [], deploy_ctx, errors)
+
+    assert not errors
+    assert type(res) is dict
+    assert type(res['buckets']['mybucket']) is dict
+    assert res['buckets']['mybucket'] == {'public': False, 'extaccesspolicy': 'MyPolicy'}
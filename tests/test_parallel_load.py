@@ -0,0 +1,24 @@
+from easysam.load import resources
+
+
+def test_parallel_load_matches_serial(tmp_path, make_app):
+    # Eight import files, the last one repeating the lambda name of the first
+    files = {
+        f'backend/func{i:02}/easysam.yaml': f'lambda:\n  name: func{i % 7}\n  integration:\n    path: /path{i}\n'
+        f'    open: true\ntables:\n  table{i}:\n    attributes:\n      - name: id\n        hash: true\n'
+        for i in range(8)
+    }
+    make_app({'resources.yaml': 'prefix: test\nimport: [backend]', **files})
+    deploy_ctx = {'environment': 'dev', 'target_region': 'us-east-1'}
+
+    serial_errors = []
+    serial = resources(tmp_path, [], deploy_ctx, serial_errors, {'no_cache': True})
+
+    parallel_errors = []
+    parallel = resources(tmp_path, [], deploy_ctx, parallel_errors, {'no_cache': True, 'workers': 4})
+
+    assert parallel == serial
+    assert parallel_errors == serial_errors
+    assert len(parallel_errors) == 1
+    assert 'func07' in parallel_errors[0]
+    assert 'duplicate lambda name func0' in parallel_errors[0]
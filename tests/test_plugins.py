@@ -1,6 +1,6 @@
 import yaml
 from pathlib import Path
-from easysam.generate import generate
+from easysam.generate import generate, overlay
 
 
 def test_plugins_generation():
@@ -36,3 +36,38 @@ def test_plugins_generation():
         plugin_data = yaml.safe_load(f)
 
     assert 'mycustomfunFunction' in plugin_data['Resources']
+
+
+def test_overlay_leaves_base_untouched():
+    base = {'prefix': 'App', 'tables': {'Items': {'ttl': 'expires'}}, 'functions': {'func': {}}, 'tags': ['a']}
+    layer = {'tables': {'Items': {'trigger': 'func'}, 'Other': {}}, 'tags': ['b'], 'funname': 'custom'}
+
+    result = overlay(base, layer)
+
+    assert result == {
+        'prefix': 'App',
+        'tables': {'Items': {'ttl': 'expires', 'trigger': 'func'}, 'Other': {}},
+        'functions': {'func': {}},
+        'tags': ['b'],
+        'funname': 'custom',
+    }
+    assert base == {'prefix': 'App', 'tables': {'Items': {'ttl': 'expires'}}, 'functions': {'func': {}}, 'tags': ['a']}
+    assert result['functions'] is base['functions']
+
+
+def test_plugins_do_not_share_aux(tmp_path):
+    (tmp_path / 'resources.yaml').write_text(
+        'prefix: Isolated\n'
+        'plugins:\n'
+        '  first:\n    template: plugin.j2\n    aux:\n      funname: firstfun\n'
+        '  second:\n    template: plugin.j2\n',
+        encoding='utf-8',
+    )
+    (tmp_path / 'plugin.j2').write_text('Name: {{ funname | default("none") }}\n', encoding='utf-8')
+
+    resources_data, errors = generate({'no_cache': True}, tmp_path, [], {'environment': 'dev'})
+
+    assert not errors
+    assert (tmp_path / 'first.yaml').read_text() == 'Name: firstfun'
+    assert (tmp_path / 'second.yaml').read_text() == 'Name: none'
+    assert 'funname' not in resources_data
@@ -1,6 +1,14 @@
+import logging
+import os
+import shutil
+import sys
 import yaml
 from pathlib import Path
+
+import pytest
+
 from easysam.generate import generate
+from easysam.prismarine import ModelWorker
 
 
 def test_prismarine_generation():
@@ -50,3 +58,118 @@ def test_prismarine_generation():
     assert 'itemloggerFunction' in resources
     itemlogger = resources['itemloggerFunction']
     assert itemlogger['Type'] == 'AWS::Serverless::Function'
+
+
+def copy_example(tmp_path):
+    app_dir = tmp_path / 'prismarine'
+    shutil.copytree('example/prismarine', app_dir, ignore=shutil.ignore_patterns('build', 'prismarine_client.py'))
+    return app_dir
+
+
+def generate_clients(app_dir, caplog, cliparams=None):
+    caplog.clear()
+    _, errors = generate(cliparams or {}, app_dir, [], {'environment': 'dev', 'target_region': 'us-east-1'})
+    assert not errors
+    return caplog.messages
+
+
+@pytest.mark.usefixtures('ruff_on_path')
+def test_prismarine_cluster_discovered_once(tmp_path, caplog):
+    caplog.set_level(logging.DEBUG)
+    app_dir = copy_example(tmp_path)
+    base_dir = (app_dir / 'common').resolve()
+
+    for name in [name for name in sys.modules if name.split('.')[0] == 'myobject']:
+        del sys.modules[name]
+
+    messages = generate_clients(app_dir, caplog)
+    assert len([m for m in messages if m.startswith(f'Discovered prismarine cluster myobject of {base_dir}')]) == 1
+    assert f'Reusing prismarine cluster myobject of {base_dir}' in messages
+    assert 'Built prismarine client for myobject' in ' '.join(messages)
+
+    # The models are only imported by the model worker
+    assert not [name for name in sys.modules if name.split('.')[0] == 'myobject']
+
+
+@pytest.mark.usefixtures('ruff_on_path')
+def test_prismarine_client_skipped_when_unchanged(tmp_path, caplog):
+    caplog.set_level(logging.DEBUG)
+    app_dir = copy_example(tmp_path)
+    client_path = app_dir / 'common' / 'myobject' / 'prismarine_client.py'
+
+    def built(messages):
+        return any(m.startswith('Built prismarine client for myobject') for m in messages)
+
+    assert built(generate_clients(app_dir, caplog))
+    assert 'from common.dynamo_access import get_dynamo_access' in client_path.read_text(encoding='utf-8')
+    assert 'Prismarine client for myobject is up to date' in generate_clients(app_dir, caplog)
+
+    models = app_dir / 'common' / 'myobject' / 'models.py'
+    models.write_text(models.read_text(encoding='utf-8') + '\n# changed\n', encoding='utf-8')
+    assert built(generate_clients(app_dir, caplog))
+    assert not built(generate_clients(app_dir, caplog))
+
+    resources = app_dir / 'resources.yaml'
+    resources.write_text(
+        resources.read_text(encoding='utf-8').replace('common.dynamo_access', 'common.utils'), encoding='utf-8'
+    )
+    assert built(generate_clients(app_dir, caplog))
+    assert 'from common.utils import get_dynamo_access' in client_path.read_text(encoding='utf-8')
+
+    client_path.unlink()
+    assert built(generate_clients(app_dir, caplog))
+    assert client_path.exists()
+
+    assert built(generate_clients(app_dir, caplog, {'no_cache': True}))
+
+
+@pytest.mark.usefixtures('ruff_on_path')
+def test_prismarine_packages_with_the_same_name(tmp_path):
+    app_dir = copy_example(tmp_path)
+    other_dir = app_dir / 'other' / 'myobject'
+    other_dir.mkdir(parents=True)
+    models = (app_dir / 'common' / 'myobject' / 'models.py').read_text(encoding='utf-8')
+    (other_dir / 'models.py').write_text(models.replace('class Item(', 'class Order('), encoding='utf-8')
+    resources = app_dir / 'resources.yaml'
+    resources.write_text(
+        resources.read_text(encoding='utf-8') + '    - package: myobject\n      base: other\n', encoding='utf-8'
+    )
+
+    _, errors = generate({}, app_dir, [], {'environment': 'dev', 'target_region': 'us-east-1'})
+    assert not errors
+
+    template = (app_dir / 'template.yml').read_text(encoding='utf-8')
+    assert 'MyAppWithPrismarineItem:' in template
+    assert 'MyAppWithPrismarineOrder:' in template
+    assert 'class OrderModel' in (other_dir / 'prismarine_client.py').read_text(encoding='utf-8')
+
+
+def test_prismarine_clients_not_generated_after_template_error(tmp_path):
+    app_dir = copy_example(tmp_path)
+    broken = tmp_path / 'broken.j2'
+    broken.write_text('Resources: {% if %}\n', encoding='utf-8')
+
+    _, errors = generate(
+        {'override_main_template': broken}, app_dir, [], {'environment': 'dev', 'target_region': 'us-east-1'}
+    )
+
+    assert len(errors) == 1
+    assert errors[0].startswith('Error generating template: ')
+    assert not (app_dir / 'common' / 'myobject' / 'prismarine_client.py').exists()
+
+
+def test_model_worker_restarted_above_max_rss():
+    pytest.importorskip('resource')
+    worker = ModelWorker()
+
+    try:
+        pid = worker.run(os.getpid)
+        assert pid != os.getpid()
+        assert worker.run(os.getpid) == pid
+
+        worker.max_rss = 0
+        assert worker.run(os.getpid) == pid
+        assert worker.run(os.getpid) != pid
+
+    finally:
+        worker.stop()
@@ -1,3 +1,5 @@
+import shutil
+import pytest
 import yaml
 from pathlib import Path
 from easysam.generate import generate
@@ -51,3 +53,43 @@ def test_prismarinettl_generation():
     if resources:
         assert 'PrismaTTLItem' in resources
         assert resources['PrismaTTLItem']['Type'] == 'AWS::DynamoDB::Table'
+
+
+@pytest.mark.usefixtures('ruff_on_path')
+def test_parallel_prismarine_clients_match_serial(tmp_path):
+    deploy_ctx = {'environment': 'prodsam', 'target_region': 'us-east-1'}
+    clients = {}
+
+    for workers in [1, 2]:
+        app_dir = tmp_path / f'workers{workers}'
+        shutil.copytree('example/prismarineconditionals', app_dir)
+        _, errors = generate({'workers': workers}, app_dir, [], deploy_ctx)
+        assert not errors
+
+        clients[workers] = {
+            path.relative_to(app_dir).as_posix(): path.read_text(encoding='utf-8')
+            for path in app_dir.rglob('prismarine_client.py')
+        }
+
+    assert sorted(clients[1]) == ['common/condition/prismarine_client.py', 'common/myobject/prismarine_client.py']
+    assert clients[2] == clients[1]
+
+
+@pytest.mark.usefixtures('ruff_on_path')
+def test_parallel_prismarine_models_import_sibling_packages(tmp_path):
+    app_dir = tmp_path / 'app'
+    shutil.copytree(
+        'example/prismarineconditionals', app_dir, ignore=shutil.ignore_patterns('build', 'prismarine_client.py')
+    )
+    (app_dir / 'common' / 'naming.py').write_text("PREFIX = 'MyAppWithPrismarine'\n", encoding='utf-8')
+
+    for package in ['condition', 'myobject']:
+        models_path = app_dir / 'common' / package / 'models.py'
+        models = models_path.read_text(encoding='utf-8')
+        models = models.replace("c = Cluster('MyAppWithPrismarine')", 'c = Cluster(PREFIX)')
+        models_path.write_text(f'from common.naming import PREFIX\n{models}', encoding='utf-8')
+
+    _, errors = generate({'workers': 2}, app_dir, [], {'environment': 'prodsam', 'target_region': 'us-east-1'})
+    assert not errors
+    assert 'Cluster(PREFIX)' in (app_dir / 'common' / 'myobject' / 'models.py').read_text(encoding='utf-8')
+    assert len(list(app_dir.rglob('prismarine_client.py'))) == 2
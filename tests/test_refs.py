@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from easysam.refs import Reference, ResourceIndex
+from easysam.validate_schema import validate
+
+
+RESOURCES_DATA = {
+    'prefix': 'test',
+    'functions': {
+        'worker': {'uri': 'backend/worker', 'tables': ['items', 'missing'], 'polls': [{'name': 'jobs'}]},
+        'auth': {'uri': 'backend/auth'},
+    },
+    'tables': {
+        'items': {'attributes': [{'name': 'id', 'hash': True}], 'trigger': {'function': 'worker'}},
+    },
+    'queues': {'jobs': None},
+    'authorizers': {'token': {'function': 'auth', 'token': 'Authorization'}},
+    'paths': {
+        '/work': {'integration': 'lambda', 'function': 'worker', 'authorizer': 'token', 'greedy': True},
+    },
+}
+
+
+def test_resource_index():
+    index = ResourceIndex(RESOURCES_DATA)
+
+    assert index.defines('queues', 'jobs')
+    assert not index.defines('tables', 'missing')
+
+    assert index.references_to('functions', 'worker') == [
+        Reference('tables', 'items', 'trigger', 'functions', 'worker'),
+        Reference('paths', '/work', 'function', 'functions', 'worker'),
+    ]
+
+    assert [ref.field for ref in index.references_from('functions', 'worker')] == ['tables', 'tables', 'polls']
+    assert [str(ref) for ref in index.unresolved()] == ['functions.worker -> tables.missing (tables)']
+
+
+def test_cross_reference_validation():
+    errors = []
+    validate(Path('.'), RESOURCES_DATA, errors)
+
+    assert errors == ['Lambda worker: Table missing must be a valid table']
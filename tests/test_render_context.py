@@ -0,0 +1,25 @@
+from easysam.generate import render_context
+
+
+def test_render_context_lookup_maps():
+    resources_data = {
+        'functions': {'reader': {}, 'writer': {}},
+        'tables': {
+            'items': {'trigger': {'function': 'writer'}},
+            'logs': {'trigger': {'function': 'writer'}},
+            'users': {},
+        },
+        'paths': {
+            '/items': {'integration': 'lambda', 'function': 'reader'},
+            '/jobs': {'integration': 'sqs', 'queue': 'jobs'},
+            '/users': {'integration': 'lambda', 'function': 'reader'},
+        },
+    }
+
+    context = render_context(resources_data)
+
+    assert context['functions'] is resources_data['functions']
+    assert context['triggers_by_function'] == {'writer': ['items', 'logs']}
+    assert list(context['paths_by_function']) == ['reader']
+    assert list(context['paths_by_function']['reader']) == ['/items', '/users']
+    assert 'triggers_by_function' not in resources_data
@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import pytest
+
+import easysam.generate
+from easysam.generate import jinja_environment, template_bytecode_cache
+
+
+TEMPLATE_DIR = (str(Path(easysam.generate.__file__).parent.resolve()),)
+
+
+@pytest.fixture
+def user_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('EASYSAM_CACHE_DIR', str(tmp_path))
+    jinja_environment.cache_clear()
+    template_bytecode_cache.cache_clear()
+    yield tmp_path
+    jinja_environment.cache_clear()
+    template_bytecode_cache.cache_clear()
+
+
+def test_shared_environment(user_cache):
+    jenv = jinja_environment(TEMPLATE_DIR)
+
+    assert jinja_environment(TEMPLATE_DIR) is jenv
+    assert jenv.get_template('template.j2') is jenv.get_template('template.j2')
+
+
+def test_bytecode_cache(user_cache):
+    jinja_environment(TEMPLATE_DIR).get_template('swagger.j2')
+    assert len(list(user_cache.glob('jinja/*.cache'))) == 1
+
+    jinja_environment.cache_clear()
+    jinja_environment(TEMPLATE_DIR).get_template('swagger.j2')
+    assert len(list(user_cache.glob('jinja/*.cache'))) == 1
+
+
+def test_bytecode_cache_disabled(user_cache):
+    jinja_environment(TEMPLATE_DIR, False).get_template('swagger.j2')
+    assert not list(user_cache.glob('jinja/*.cache'))
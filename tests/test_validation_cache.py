@@ -0,0 +1,63 @@
+import copy
+import logging
+
+import easysam.validate_schema
+
+from easysam.cache import DiskCache
+from easysam.validate_schema import schema_errors, schema_validator
+
+
+RESOURCES_DATA = {
+    'prefix': 'test',
+    'functions': {
+        'first': {'uri': 'backend/first'},
+        'second': {'uri': 'backend/second', 'memory': 'large'},
+        'Invalid_Name': {'uri': 'backend/invalid'},
+    },
+    'tables': {'items': {'attributes': [{'name': 'id', 'hash': True}]}},
+    'paths': {'/items': {'integration': 'lambda', 'function': 'first', 'greedy': True, 'open': True}},
+    'unknown': {},
+}
+
+
+def validated_resources(caplog):
+    return [r.message for r in caplog.records if r.message.endswith('against the schema')]
+
+
+def test_schema_errors_match_full_validation():
+    full = sorted(
+        f'Invalid resources data: {error.message} in {list(error.path)}'
+        for error in schema_validator('schemas.json').iter_errors(RESOURCES_DATA)
+    )
+
+    assert len(full) == 3
+    assert schema_errors(RESOURCES_DATA) == full
+
+
+def test_schema_errors_cached_per_resource(tmp_path, caplog):
+    caplog.set_level(logging.DEBUG)
+    cache = DiskCache(tmp_path)
+    expected = schema_errors(RESOURCES_DATA)
+
+    caplog.clear()
+    assert schema_errors(RESOURCES_DATA, cache) == expected
+    assert len(validated_resources(caplog)) == 4
+
+    caplog.clear()
+    assert schema_errors(RESOURCES_DATA, cache) == expected
+    assert not validated_resources(caplog)
+
+    changed = copy.deepcopy(RESOURCES_DATA)
+    changed['functions']['second']['memory'] = 256
+
+    caplog.clear()
+    assert len(schema_errors(changed, cache)) == 2
+    assert validated_resources(caplog) == ['Validating functions second against the schema']
+
+
+def test_schema_errors_without_cache_skip_digests(monkeypatch):
+    def fail(*parts):
+        raise AssertionError('Resources digested without a cache')
+
+    monkeypatch.setattr(easysam.validate_schema, 'digest', fail)
+    assert len(schema_errors(RESOURCES_DATA)) == 3
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import pytest
+
+import easysam.validate_schema as validate_schema
+from easysam.validate_schema import schema_validator, validate_local
+
+
+VALID_ENTRY = {
+    'lambda': {
+        'name': 'myfunc',
+        'integration': {'path': '/test', 'open': True},
+        'resources': {'tables': ['table'], 'buckets': ['bucket']},
+    },
+    'tables': {'table': {'attributes': [{'name': 'id', 'hash': True}]}},
+}
+
+INVALID_ENTRY = {'invalid_section': 'something', 'lambda': {'timeout': 'long'}}
+
+
+def test_schema_validators_compiled_once():
+    assert schema_validator('local_schemas.json') is schema_validator('local_schemas.json')
+    assert schema_validator('schemas.json') is schema_validator('schemas.json')
+
+
+@pytest.mark.parametrize('fast', [False, True])
+def test_validate_local_errors(fast):
+    if fast:
+        pytest.importorskip('fastjsonschema')
+
+    errors = []
+    validate_local(Path('easysam.yaml'), VALID_ENTRY, errors, fast)
+    assert not errors
+
+    validate_local(Path('easysam.yaml'), INVALID_ENTRY, errors, fast)
+    assert len(errors) == 3
+    assert any('invalid_section' in err and 'Additional properties' in err for err in errors)
+
+
+def test_validate_local_fast_skips_jsonschema(monkeypatch):
+    pytest.importorskip('fastjsonschema')
+
+    def fail(schema_file):
+        raise AssertionError(f'{schema_file} validated with jsonschema')
+
+    monkeypatch.setattr(validate_schema, 'schema_validator', fail)
+    errors = []
+    validate_local(Path('easysam.yaml'), VALID_ENTRY, errors, fast=True)
+    assert not errors
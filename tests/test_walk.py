@@ -0,0 +1,59 @@
+from easysam.load import resources
+from easysam.walk import find_files
+
+
+def touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('', encoding='utf-8')
+
+
+def rel(paths, root):
+    return [p.relative_to(root).as_posix() for p in paths]
+
+
+def test_find_files_skip_dirs(tmp_path):
+    for name in ['a.py', 'sub/b.py', 'build/c.py', '.venv/d.py', 'sub/common/e.py', 'sub/__pycache__/f.py', 'g.txt']:
+        touch(tmp_path / name)
+
+    assert rel(find_files(tmp_path, '*.py'), tmp_path) == ['a.py', 'build/c.py', 'sub/b.py', 'sub/common/e.py']
+
+
+def test_find_files_skip_lambda_common_copies(tmp_path):
+    for name in ['func/easysam.yaml', 'func/index.py', 'func/common/a.py', 'func/lib/common/b.py', 'common/c.py']:
+        touch(tmp_path / name)
+
+    assert rel(find_files(tmp_path, '*.py'), tmp_path) == ['common/c.py', 'func/index.py', 'func/lib/common/b.py']
+
+
+def test_find_files_max_depth(tmp_path):
+    for name in ['a.py', 'x/b.py', 'x/y/c.py']:
+        touch(tmp_path / name)
+
+    assert rel(find_files(tmp_path, '*.py', max_depth=0), tmp_path) == ['a.py']
+    assert rel(find_files(tmp_path, '*.py', max_depth=1), tmp_path) == ['a.py', 'x/b.py']
+
+
+def test_find_files_ignore_file(tmp_path):
+    for name in ['keep.py', 'skip.py', 'gen/a.py', 'x/gen/b.py', 'docs/c.py', 'x/docs/d.py', 'x/local.py']:
+        touch(tmp_path / name)
+
+    (tmp_path / '.easysamignore').write_text('# comment\n*.py\n!keep.py\n!x/**\ngen/\n/docs\n', encoding='utf-8')
+    (tmp_path / 'x' / '.easysamignore').write_text('local.py\n', encoding='utf-8')
+
+    assert rel(find_files(tmp_path, '*.py'), tmp_path) == ['keep.py', 'x/docs/d.py']
+
+
+def test_imports_skip_build_copies(tmp_path):
+    (tmp_path / 'resources.yaml').write_text('prefix: test\nimport: [backend]', encoding='utf-8')
+    easysam_yaml = 'lambda:\n  name: myfunc\n  integration:\n    path: /test\n    open: true\n'
+
+    for stale in ['backend/func', 'backend/.aws-sam/build/func', 'backend/func/common/x']:
+        path = tmp_path / stale / 'easysam.yaml'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(easysam_yaml, encoding='utf-8')
+
+    errors = []
+    res = resources(tmp_path, [], {}, errors)
+
+    assert not errors
+    assert list(res['functions']) == ['myfunc']
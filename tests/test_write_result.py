@@ -0,0 +1,52 @@
+import logging
+from pathlib import Path
+
+from easysam.generate import generate, non_blank_lines, write_result
+
+
+def test_write_result_if_changed(tmp_path):
+    output = tmp_path / 'build' / 'output.yaml'
+    changed = []
+
+    write_result(output, ['a: 1\n\n ', ' \nb', ': 2\n'], changed)
+    assert output.read_text() == 'a: 1\nb: 2'
+    assert changed == [output]
+
+    plain = tmp_path / 'plain.yaml'
+    plain.write_text('a: 1')
+    assert output.stat().st_mode == plain.stat().st_mode
+
+    mtime = output.stat().st_mtime_ns
+    write_result(output, ['a: 1\nb: 2\n'], changed)
+    assert output.stat().st_mtime_ns == mtime
+    assert changed == [output]
+
+    write_result(output, ['a: 1\nb: 3\n'], changed)
+    assert output.read_text() == 'a: 1\nb: 3'
+    assert changed == [output, output]
+
+
+def test_generate_reports_changed_outputs(tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    deploy_ctx = {'environment': 'dev', 'target_region': 'us-east-1'}
+
+    _, errors = generate({}, Path('example/myapp'), [], deploy_ctx, tmp_path)
+    assert not errors
+    assert f'Changed outputs: {tmp_path / "template.yml"}, {tmp_path / "build" / "swagger.yaml"}' in caplog.messages
+
+    mtime = (tmp_path / 'template.yml').stat().st_mtime_ns
+    caplog.clear()
+
+    _, errors = generate({}, Path('example/myapp'), [], deploy_ctx, tmp_path)
+    assert not errors
+    assert 'All outputs are up to date' in caplog.messages
+    assert (tmp_path / 'template.yml').stat().st_mtime_ns == mtime
+
+
+def test_non_blank_lines_matches_splitlines():
+    text = 'Resources:\r\n  \n  Function:\x0c\n\n    Type: Lambda   x\n\n  last'
+    expected = [line for line in text.splitlines() if line.strip()]
+
+    for size in [1, 2, 3, 7, len(text)]:
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert list(non_blank_lines(chunks)) == expected